@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Cannect Customer Intelligence - Write Path Benchmark
+Times saving N synthetic classifications one per transaction (classifier.save_classification,
+as the sequential classifier does) against writer.save_classifications batches.
+
+  python bench_writes.py [--rows 2000] [--batch-sizes 50,100,500] [--threads 1,10] [--json]
+
+Runs against the configured database, inside a scratch schema copied from posts and
+post_classifications (LIKE ... INCLUDING ALL), so real rows are never touched.
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+BENCH_SCHEMA = 'cci_bench'
+
+# Every pooled connection resolves unqualified table names to the scratch schema only
+os.environ['PGOPTIONS'] = f'-c search_path={BENCH_SCHEMA}'
+# classifier.py builds its API client at import; the benchmark never calls it
+os.environ.setdefault('DEEPSEEK_API_KEY', 'unused')
+
+import db
+import writer
+import classifier
+
+SENTIMENTS = ['positive', 'negative', 'neutral', 'mixed']
+EFFECTS = ['relaxed', 'sleepy', 'creative', 'euphoric', 'focused', 'hungry']
+
+
+def setup_schema(rows: int):
+    """(Re)create the scratch tables and fill posts with rows unprocessed posts."""
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;
+                CREATE SCHEMA {BENCH_SCHEMA};
+                CREATE TABLE {BENCH_SCHEMA}.posts (LIKE public.posts INCLUDING ALL);
+                CREATE TABLE {BENCH_SCHEMA}.post_classifications (LIKE public.post_classifications INCLUDING ALL);
+                -- Own id sequence so the copied default doesn't draw from the real table's
+                CREATE SEQUENCE {BENCH_SCHEMA}.post_classifications_id_seq;
+                ALTER TABLE {BENCH_SCHEMA}.post_classifications
+                    ALTER COLUMN id SET DEFAULT nextval('{BENCH_SCHEMA}.post_classifications_id_seq');
+            """)
+            cur.execute(f"""
+                INSERT INTO {BENCH_SCHEMA}.posts (id, uri, cid, author_did, post_created_at, indexed_at, text_content)
+                SELECT i, 'at://bench/' || i, 'cid' || i, 'did:plc:bench', NOW(), NOW(), 'bench post ' || i
+                FROM generate_series(1, %s) AS i
+            """, (rows,))
+
+
+def reset():
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('TRUNCATE post_classifications')
+            cur.execute('UPDATE posts SET processed_at = NULL, classification_version = 0')
+            cur.execute('ANALYZE posts')
+
+
+def synthetic_results(rows: int, seed: int = 0) -> List[Tuple[int, Dict]]:
+    rng = random.Random(seed)
+    return [
+        (post_id, {
+            'model_version': classifier.MODEL_VERSION,
+            'processing_ms': rng.randint(800, 4000),
+            'experience_level': rng.choice(['casual', 'regular', 'daily', 'unknown']),
+            'consumer_type': rng.choice(['wellness', 'recreational', 'medical']),
+            'lifestyle_tags': rng.sample(['active', 'creative', 'professional', 'parent'], 2),
+            'time_of_day': rng.choice(['morning', 'evening', 'night']),
+            'intent_type': 'sharing',
+            'purchase_intent': rng.randint(0, 100),
+            'effects_mentioned': rng.sample(EFFECTS, 2),
+            'effects_desired': [],
+            'sentiment': rng.choice(SENTIMENTS),
+            'sentiment_score': rng.randint(-100, 100),
+            'emotions': ['calm'],
+            'frustrations': [],
+            'data_richness': rng.randint(1, 10),
+            'business_value': 'medium',
+            'audience_segments': ['wellness_brand_target'],
+        })
+        for post_id in range(1, rows + 1)
+    ]
+
+
+def check_saved(rows: int):
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM post_classifications')
+            classified = cur.fetchone()[0]
+            cur.execute('SELECT COUNT(*) FROM posts WHERE processed_at IS NOT NULL')
+            processed = cur.fetchone()[0]
+    assert classified == processed == rows, f'saved {classified} classifications, {processed} processed of {rows}'
+
+
+def run(mode: str, results: List[Tuple[int, Dict]], threads: int, batch_size: int = 1) -> Dict:
+    """Save results with threads concurrent writers, as the parallel classifier does."""
+    reset()
+    if mode == 'per_row':
+        units = results
+        save = lambda result: classifier.save_classification(*result)
+    else:
+        units = [results[i:i + batch_size] for i in range(0, len(results), batch_size)]
+        save = writer.save_classifications
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(save, units))
+    elapsed = time.perf_counter() - start
+
+    check_saved(len(results))
+    return {
+        'mode': mode,
+        'batch_size': batch_size,
+        'threads': threads,
+        'rows': len(results),
+        'transactions': len(units),
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(len(results) / elapsed, 1),
+    }
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CCI classification write path benchmark')
+    parser.add_argument('--rows', type=int, default=2000, help='Synthetic classifications per run')
+    parser.add_argument('--batch-sizes', type=int_list, default=[50, 100, 500], help='Comma-separated rows per batch write')
+    parser.add_argument('--threads', type=int_list, default=[1, 10], help='Comma-separated concurrent writers')
+    parser.add_argument('--keep', action='store_true', help=f'Leave the {BENCH_SCHEMA} schema in place afterwards')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    # One pooled connection per writer thread (read by get_pool() on first use)
+    db.DB_POOL_MAX = max(db.DB_POOL_MAX, max(args.threads))
+
+    setup_schema(args.rows)
+    results = synthetic_results(args.rows)
+    runs = []
+    try:
+        for threads in args.threads:
+            runs.append(run('per_row', results, threads))
+            for batch_size in args.batch_sizes:
+                runs.append(run('batch', results, threads, batch_size))
+    finally:
+        if not args.keep:
+            with db.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f'DROP SCHEMA {BENCH_SCHEMA} CASCADE')
+        db.close_pool()
+
+    if args.json:
+        print(json.dumps(runs, indent=2))
+    else:
+        for r in runs:
+            baseline = next(b for b in runs if b['mode'] == 'per_row' and b['threads'] == r['threads'])
+            label = 'per-row' if r['mode'] == 'per_row' else f'batch {r["batch_size"]}'
+            print(f'{label:>10} x{r["threads"]:<3} {r["rows_per_sec"]:>9.1f} rows/s '
+                  f'({r["transactions"]} transactions, {r["rows_per_sec"] / baseline["rows_per_sec"]:.1f}x per-row)')
@@ -4,16 +4,16 @@ Cannect Customer Intelligence - User Profile Builder
 Aggregates post classifications into user profiles.
 """
 
-import os
 import json
 import logging
 from collections import Counter
 from typing import Dict, List, Any
 
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
+from db import get_connection
+
 load_dotenv()
 
 logging.basicConfig(
@@ -23,20 +23,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_db_connection():
-    """Get PostgreSQL connection."""
-    return psycopg2.connect(
-        host=os.getenv('DB_HOST', 'localhost'),
-        port=int(os.getenv('DB_PORT', '5432')),
-        database=os.getenv('DB_NAME', 'cannect_intel'),
-        user=os.getenv('DB_USER', 'cci'),
-        password=os.getenv('DB_PASSWORD', '')
-    )
-
-
 def get_users_with_posts(min_posts: int = 1) -> List[Dict]:
     """Get all users with classified posts."""
-    with get_db_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
                 SELECT 
@@ -56,7 +45,7 @@ def get_users_with_posts(min_posts: int = 1) -> List[Dict]:
 
 def get_user_classifications(author_did: str) -> List[Dict]:
     """Get all classifications for a user."""
-    with get_db_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
                 SELECT pc.*, p.post_created_at
@@ -196,7 +185,7 @@ def build_user_profile(user: Dict, classifications: List[Dict]) -> Dict:
 
 def save_user_profile(profile: Dict):
     """Save or update user profile in database."""
-    with get_db_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO user_profiles (
@@ -282,7 +271,7 @@ def build_all_profiles(min_posts: int = 1):
 
 def get_profile_stats():
     """Get profile statistics."""
-    with get_db_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
                 SELECT 
@@ -11,12 +11,15 @@ import logging
 from datetime import datetime
 from typing import Optional, Dict, Any
 
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from openai import OpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 
+from db import get_connection
+from leases import claim_posts, renew_claims, release_claims, CLAIM_LEASE_SECONDS
+from ratelimit import RateLimiter, estimate_tokens, retry_delay
+from writer import save_classifications
+
 load_dotenv()
 
 # Configure logging
@@ -29,10 +32,16 @@ logger = logging.getLogger(__name__)
 # DeepSeek API client (OpenAI-compatible)
 client = OpenAI(
     api_key=os.getenv('DEEPSEEK_API_KEY'),
-    base_url='https://api.deepseek.com'
+    base_url='https://api.deepseek.com',
+    # 429s must reach the rate limiter rather than being retried inside the client
+    max_retries=0
 )
 
 MODEL_VERSION = 'deepseek-chat-20260131'
+MAX_TOKENS = 1000  # Completion budget per classification
+
+# Paces calls to the DeepSeek quota and honours Retry-After after a 429
+limiter = RateLimiter(max_concurrency=1)
 
 # Classification prompt
 CLASSIFICATION_PROMPT = """You are a cannabis consumer intelligence analyst. Analyze this social media post and extract consumer insights.
@@ -102,161 +111,61 @@ IMPORTANT:
 - Return null for text fields that are unknown/not applicable"""
 
 
-def get_db_connection():
-    """Get PostgreSQL connection."""
-    return psycopg2.connect(
-        host=os.getenv('DB_HOST', 'localhost'),
-        port=int(os.getenv('DB_PORT', '5432')),
-        database=os.getenv('DB_NAME', 'cannect_intel'),
-        user=os.getenv('DB_USER', 'cci'),
-        password=os.getenv('DB_PASSWORD', '')
-    )
-
-
-def get_unprocessed_posts(limit: int = 100) -> list:
-    """Get posts that haven't been classified yet."""
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT id, uri, text_content, has_media, embed_type, langs, post_created_at
-                FROM posts
-                WHERE processed_at IS NULL
-                  AND text_content IS NOT NULL
-                  AND text_content != ''
-                ORDER BY post_created_at DESC
-                LIMIT %s
-            """, (limit,))
-            return cur.fetchall()
-
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
 def classify_post(post: Dict[str, Any]) -> Optional[Dict]:
-    """Classify a single post using DeepSeek API."""
-    try:
-        start_time = time.time()
-        
-        prompt = CLASSIFICATION_PROMPT.format(
-            text=post['text_content'][:2000],  # Limit text length
-            has_media=post.get('has_media', False),
-            embed_type=post.get('embed_type', 'none'),
-            langs=post.get('langs', ['en']),
-            created_at=post.get('post_created_at', 'unknown')
-        )
-        
-        response = client.chat.completions.create(
-            model='deepseek-chat',
-            messages=[
-                {'role': 'system', 'content': 'You are a cannabis consumer intelligence analyst. Return only valid JSON.'},
-                {'role': 'user', 'content': prompt}
-            ],
-            temperature=0.1,
-            max_tokens=1000,
-            response_format={'type': 'json_object'}
-        )
-        
-        processing_ms = int((time.time() - start_time) * 1000)
-        result = json.loads(response.choices[0].message.content)
-        result['processing_ms'] = processing_ms
-        result['model_version'] = MODEL_VERSION
-        
-        return result
-        
-    except json.JSONDecodeError as e:
-        logger.error(f'JSON decode error for post {post["id"]}: {e}')
-        return None
-    except Exception as e:
-        logger.error(f'Classification error for post {post["id"]}: {e}')
-        raise
+    """Classify a single post using DeepSeek API, retrying 429s, timeouts and 5xx responses."""
+    prompt = CLASSIFICATION_PROMPT.format(
+        text=post['text_content'][:2000],  # Limit text length
+        has_media=post.get('has_media', False),
+        embed_type=post.get('embed_type', 'none'),
+        langs=post.get('langs', ['en']),
+        created_at=post.get('post_created_at', 'unknown')
+    )
+    
+    attempt = 0
+    while True:
+        try:
+            with limiter.call_sync(estimate_tokens(prompt, MAX_TOKENS)) as call:
+                start_time = time.time()
+                response = client.chat.completions.create(
+                    model='deepseek-chat',
+                    messages=[
+                        {'role': 'system', 'content': 'You are a cannabis consumer intelligence analyst. Return only valid JSON.'},
+                        {'role': 'user', 'content': prompt}
+                    ],
+                    temperature=0.1,
+                    max_tokens=MAX_TOKENS,
+                    response_format={'type': 'json_object'}
+                )
+                processing_ms = int((time.time() - start_time) * 1000)
+                call.used(getattr(getattr(response, 'usage', None), 'total_tokens', None))
+            
+            result = json.loads(response.choices[0].message.content)
+            result['processing_ms'] = processing_ms
+            result['model_version'] = MODEL_VERSION
+            
+            return result
+            
+        except json.JSONDecodeError as e:
+            logger.error(f'JSON decode error for post {post["id"]}: {e}')
+            return None
+        except Exception as e:
+            delay = retry_delay(e, attempt)
+            if delay is None:
+                logger.error(f'Classification error for post {post["id"]}: {e}')
+                raise
+            attempt += 1
+            logger.warning(f'Retrying post {post["id"]} (attempt {attempt + 1}) after: {e}')
+            time.sleep(delay)
 
 
 def save_classification(post_id: int, classification: Dict):
     """Save classification to database."""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            # Insert classification
-            cur.execute("""
-                INSERT INTO post_classifications (
-                    post_id, model_version, confidence, processing_ms,
-                    experience_level, consumer_type, lifestyle_tags,
-                    occasion, setting, mood_before, mood_after, time_of_day, is_ritual,
-                    intent_type, purchase_intent, purchase_stage,
-                    product_category, effects_mentioned, effects_desired, quality_perception, dosage_pattern,
-                    post_type, media_type,
-                    sentiment, sentiment_score, emotions,
-                    brand_mentioned, strain_mentioned, dispensary_mentioned, price_mentioned, price_sentiment,
-                    frustrations, region_hint, legal_context,
-                    data_richness, business_value, audience_segments,
-                    raw_response
-                ) VALUES (
-                    %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s,
-                    %s
-                )
-                ON CONFLICT (post_id, model_version) DO UPDATE SET
-                    confidence = EXCLUDED.confidence,
-                    processing_ms = EXCLUDED.processing_ms,
-                    classified_at = NOW()
-            """, (
-                post_id, 
-                classification.get('model_version', MODEL_VERSION),
-                classification.get('confidence', 80),
-                classification.get('processing_ms'),
-                classification.get('experience_level'),
-                classification.get('consumer_type'),
-                classification.get('lifestyle_tags'),
-                classification.get('occasion'),
-                classification.get('setting'),
-                classification.get('mood_before'),
-                classification.get('mood_after'),
-                classification.get('time_of_day'),
-                classification.get('is_ritual', False),
-                classification.get('intent_type'),
-                classification.get('purchase_intent'),
-                classification.get('purchase_stage'),
-                classification.get('product_category'),
-                classification.get('effects_mentioned'),
-                classification.get('effects_desired'),
-                classification.get('quality_perception'),
-                classification.get('dosage_pattern'),
-                classification.get('post_type'),
-                classification.get('media_type'),
-                classification.get('sentiment'),
-                classification.get('sentiment_score'),
-                classification.get('emotions'),
-                classification.get('brand_mentioned'),
-                classification.get('strain_mentioned'),
-                classification.get('dispensary_mentioned'),
-                classification.get('price_mentioned', False),
-                classification.get('price_sentiment'),
-                classification.get('frustrations'),
-                classification.get('region_hint'),
-                classification.get('legal_context'),
-                classification.get('data_richness'),
-                classification.get('business_value'),
-                classification.get('audience_segments'),
-                json.dumps(classification)
-            ))
-            
-            # Mark post as processed
-            cur.execute("""
-                UPDATE posts SET processed_at = NOW(), classification_version = 1
-                WHERE id = %s
-            """, (post_id,))
-            
-            conn.commit()
+    save_classifications([(post_id, {'model_version': MODEL_VERSION, **classification})])
 
 
 def process_batch(batch_size: int = 50):
-    """Process a batch of unprocessed posts."""
-    posts = get_unprocessed_posts(batch_size)
+    """Process a batch of unprocessed posts, leased so other classifier workers skip them."""
+    posts = claim_posts(batch_size)
     
     if not posts:
         logger.info('No unprocessed posts found')
@@ -265,35 +174,46 @@ def process_batch(batch_size: int = 50):
     logger.info(f'Processing {len(posts)} posts...')
     processed = 0
     errors = 0
+    done = 0
+    last_renewal = time.time()
     
-    for post in posts:
-        try:
-            classification = classify_post(post)
+    try:
+        for post in posts:
+            # Rate-limit waits and retries can outlast the lease; keep the rest of the batch ours
+            if time.time() - last_renewal > CLAIM_LEASE_SECONDS / 3:
+                renew_claims([p['id'] for p in posts[done:]])
+                last_renewal = time.time()
             
-            if classification:
-                save_classification(post['id'], classification)
-                processed += 1
+            try:
+                classification = classify_post(post)
                 
-                # Log progress every 10 posts
-                if processed % 10 == 0:
-                    logger.info(f'Processed {processed}/{len(posts)} posts')
-                
-                # Rate limit: ~2 requests per second to stay within limits
-                time.sleep(0.5)
-            else:
+                if classification:
+                    save_classification(post['id'], classification)
+                    processed += 1
+                    
+                    # Log progress every 10 posts
+                    if processed % 10 == 0:
+                        logger.info(f'Processed {processed}/{len(posts)} posts')
+                else:
+                    errors += 1
+                    
+            except Exception as e:
+                logger.error(f'Failed to process post {post["id"]}: {e}')
                 errors += 1
-                
-        except Exception as e:
-            logger.error(f'Failed to process post {post["id"]}: {e}')
-            errors += 1
+            # A failed post keeps its lease, so it is retried after CLAIM_LEASE_SECONDS
+            done += 1
+    finally:
+        # Hand posts not yet attempted back so other workers needn't wait out the lease
+        release_claims([p['id'] for p in posts[done:]])
     
     logger.info(f'Batch complete: {processed} processed, {errors} errors')
+    logger.info(f'Rate limiter: {limiter.summary()}')
     return processed
 
 
 def get_stats():
     """Get processing statistics."""
-    with get_db_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
                 SELECT 
@@ -12,12 +12,15 @@ import asyncio
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from openai import AsyncOpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 
+from db import get_connection, run_async
+from ratelimit import RateLimiter, estimate_tokens, retry_delay
+from leases import claim_posts, renew_claims, release_claims, CLAIM_LEASE_SECONDS
+from writer import write_classifications, WRITE_BATCH_SIZE
+
 load_dotenv()
 
 # Configure logging
@@ -30,14 +33,24 @@ logger = logging.getLogger(__name__)
 # DeepSeek API client (Async version)
 client = AsyncOpenAI(
     api_key=os.getenv('DEEPSEEK_API_KEY'),
-    base_url='https://api.deepseek.com'
+    base_url='https://api.deepseek.com',
+    # 429s must reach the rate limiter rather than being retried inside the client
+    max_retries=0
 )
 
 MODEL_VERSION = 'deepseek-chat-20260131'
 
 # Concurrency settings
-MAX_CONCURRENT = 10  # Number of parallel API calls
-RATE_LIMIT_DELAY = 0.1  # Small delay between starting requests
+MAX_CONCURRENT = 10  # Most parallel API calls; the rate limiter adapts below this
+MAX_TOKENS = 1000  # Completion budget per classification
+
+_limiter = None
+
+# Streaming mode settings
+STREAM_QUEUE_SIZE = 50  # Posts buffered between the Postgres refill and the API workers
+STREAM_IDLE_SLEEP = 60  # Seconds to wait for new posts once the backlog is empty (continuous)
+PROGRESS_INTERVAL = 30  # Seconds between streaming progress log lines
+WRITE_FLUSH_INTERVAL = 2  # Max seconds a finished classification waits before being saved (streaming)
 
 # Classification prompt
 CLASSIFICATION_PROMPT = """You are a cannabis consumer intelligence analyst. Analyze this social media post and extract consumer insights.
@@ -107,62 +120,35 @@ IMPORTANT:
 - Return null for text fields that are unknown/not applicable"""
 
 
-def get_db_connection():
-    """Get PostgreSQL connection."""
-    return psycopg2.connect(
-        host='localhost',
-        port=5432,
-        database='cannect_intel',
-        user='cci',
-        password='cci_secure_2026'
+async def classify_post_async(post: Dict[str, Any], limiter: RateLimiter) -> tuple:
+    """Classify a single post using DeepSeek API, paced by the shared rate limiter.
+    429s, timeouts and 5xx responses are retried (see ratelimit.retry_delay)."""
+    prompt = CLASSIFICATION_PROMPT.format(
+        text=post['text_content'][:2000],
+        has_media=post.get('has_media', False),
+        embed_type=post.get('embed_type', 'none'),
+        langs=post.get('langs', ['en']),
+        created_at=post.get('post_created_at', 'unknown')
     )
-
-
-def get_unprocessed_posts(limit: int = 100) -> list:
-    """Get posts that haven't been classified yet."""
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT id, uri, text_content, has_media, embed_type, langs, post_created_at
-                FROM posts
-                WHERE processed_at IS NULL
-                  AND text_content IS NOT NULL
-                  AND text_content != ''
-                ORDER BY post_created_at DESC
-                LIMIT %s
-            """, (limit,))
-            return cur.fetchall()
-
-
-async def classify_post_async(post: Dict[str, Any], semaphore: asyncio.Semaphore) -> tuple:
-    """Classify a single post using DeepSeek API with semaphore for rate limiting."""
-    async with semaphore:
+    
+    attempt = 0
+    while True:
         try:
-            start_time = time.time()
-            
-            prompt = CLASSIFICATION_PROMPT.format(
-                text=post['text_content'][:2000],
-                has_media=post.get('has_media', False),
-                embed_type=post.get('embed_type', 'none'),
-                langs=post.get('langs', ['en']),
-                created_at=post.get('post_created_at', 'unknown')
-            )
-            
-            # Small delay to spread out requests
-            await asyncio.sleep(RATE_LIMIT_DELAY)
-            
-            response = await client.chat.completions.create(
-                model='deepseek-chat',
-                messages=[
-                    {'role': 'system', 'content': 'You are a cannabis consumer intelligence analyst. Return only valid JSON.'},
-                    {'role': 'user', 'content': prompt}
-                ],
-                temperature=0.1,
-                max_tokens=1000,
-                response_format={'type': 'json_object'}
-            )
+            async with limiter.call(estimate_tokens(prompt, MAX_TOKENS)) as call:
+                start_time = time.time()
+                response = await client.chat.completions.create(
+                    model='deepseek-chat',
+                    messages=[
+                        {'role': 'system', 'content': 'You are a cannabis consumer intelligence analyst. Return only valid JSON.'},
+                        {'role': 'user', 'content': prompt}
+                    ],
+                    temperature=0.1,
+                    max_tokens=MAX_TOKENS,
+                    response_format={'type': 'json_object'}
+                )
+                processing_ms = int((time.time() - start_time) * 1000)
+                call.used(getattr(getattr(response, 'usage', None), 'total_tokens', None))
             
-            processing_ms = int((time.time() - start_time) * 1000)
             result = json.loads(response.choices[0].message.content)
             result['processing_ms'] = processing_ms
             result['model_version'] = MODEL_VERSION
@@ -173,96 +159,26 @@ async def classify_post_async(post: Dict[str, Any], semaphore: asyncio.Semaphore
             logger.error(f'JSON decode error for post {post["id"]}: {e}')
             return (post['id'], None, str(e))
         except Exception as e:
-            logger.error(f'Classification error for post {post["id"]}: {e}')
-            return (post['id'], None, str(e))
+            delay = retry_delay(e, attempt)
+            if delay is None:
+                logger.error(f'Classification error for post {post["id"]}: {e}')
+                return (post['id'], None, str(e))
+            attempt += 1
+            logger.warning(f'Retrying post {post["id"]} (attempt {attempt + 1}) after: {e}')
+            await asyncio.sleep(delay)
 
 
-def save_classification(post_id: int, classification: Dict):
-    """Save classification to database."""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO post_classifications (
-                    post_id, model_version, confidence, processing_ms,
-                    experience_level, consumer_type, lifestyle_tags,
-                    occasion, setting, mood_before, mood_after, time_of_day, is_ritual,
-                    intent_type, purchase_intent, purchase_stage,
-                    product_category, effects_mentioned, effects_desired, quality_perception, dosage_pattern,
-                    post_type, media_type,
-                    sentiment, sentiment_score, emotions,
-                    brand_mentioned, strain_mentioned, dispensary_mentioned, price_mentioned, price_sentiment,
-                    frustrations, region_hint, legal_context,
-                    data_richness, business_value, audience_segments,
-                    raw_response
-                ) VALUES (
-                    %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s,
-                    %s
-                )
-                ON CONFLICT (post_id, model_version) DO UPDATE SET
-                    confidence = EXCLUDED.confidence,
-                    processing_ms = EXCLUDED.processing_ms,
-                    classified_at = NOW()
-            """, (
-                post_id, 
-                classification.get('model_version', MODEL_VERSION),
-                classification.get('confidence', 80),
-                classification.get('processing_ms'),
-                classification.get('experience_level'),
-                classification.get('consumer_type'),
-                classification.get('lifestyle_tags'),
-                classification.get('occasion'),
-                classification.get('setting'),
-                classification.get('mood_before'),
-                classification.get('mood_after'),
-                classification.get('time_of_day'),
-                classification.get('is_ritual', False),
-                classification.get('intent_type'),
-                classification.get('purchase_intent'),
-                classification.get('purchase_stage'),
-                classification.get('product_category'),
-                classification.get('effects_mentioned'),
-                classification.get('effects_desired'),
-                classification.get('quality_perception'),
-                classification.get('dosage_pattern'),
-                classification.get('post_type'),
-                classification.get('media_type'),
-                classification.get('sentiment'),
-                classification.get('sentiment_score'),
-                classification.get('emotions'),
-                classification.get('brand_mentioned'),
-                classification.get('strain_mentioned'),
-                classification.get('dispensary_mentioned'),
-                classification.get('price_mentioned', False),
-                classification.get('price_sentiment'),
-                classification.get('frustrations'),
-                classification.get('region_hint'),
-                classification.get('legal_context'),
-                classification.get('data_richness'),
-                classification.get('business_value'),
-                classification.get('audience_segments'),
-                json.dumps(classification)
-            ))
-            
-            cur.execute("""
-                UPDATE posts SET processed_at = NOW(), classification_version = 1
-                WHERE id = %s
-            """, (post_id,))
-            
-            conn.commit()
+def get_limiter() -> RateLimiter:
+    """The process-wide limiter, so continuous batches keep what it has learned."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(max_concurrency=MAX_CONCURRENT)
+    return _limiter
 
 
 async def process_batch_async(batch_size: int = 100):
-    """Process a batch of unprocessed posts concurrently."""
-    posts = get_unprocessed_posts(batch_size)
+    """Process a batch of unprocessed posts concurrently, holding their leases until saved."""
+    posts = await run_async(claim_posts, batch_size)
     
     if not posts:
         logger.info('No unprocessed posts found')
@@ -270,37 +186,174 @@ async def process_batch_async(batch_size: int = 100):
     
     logger.info(f'Processing {len(posts)} posts with {MAX_CONCURRENT} concurrent workers...')
     
-    # Create semaphore to limit concurrent requests
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+    # The shared limiter caps requests/min, tokens/min and calls in flight
+    limiter = get_limiter()
     
     # Create tasks for all posts
-    tasks = [classify_post_async(post, semaphore) for post in posts]
+    tasks = [classify_post_async(post, limiter) for post in posts]
     
-    # Process all concurrently
+    # Process all concurrently, renewing the leases on posts not yet saved or failed
     start_time = time.time()
-    results = await asyncio.gather(*tasks)
-    
-    # Save results
-    processed = 0
-    errors = 0
-    
-    for post_id, classification, error in results:
-        if classification:
-            save_classification(post_id, classification)
-            processed += 1
-        else:
-            errors += 1
+    in_flight = {post['id'] for post in posts}
+    renewer = asyncio.create_task(_renew_leases(in_flight))
+    try:
+        results = await asyncio.gather(*tasks)
+        # Failed posts keep their lease, so they are retried after CLAIM_LEASE_SECONDS
+        in_flight.difference_update(post_id for post_id, classification, error in results if not classification)
+        
+        # Save results in a few multi-row transactions instead of one per post
+        classified = [(post_id, classification) for post_id, classification, error in results if classification]
+        processed, failed = await run_async(write_classifications, classified)
+        in_flight.difference_update(post_id for post_id, _ in classified)
+    finally:
+        renewer.cancel()
+        await asyncio.gather(renewer, return_exceptions=True)
+        # Hand back whatever was not classified and saved (an error or interrupt) so other workers can take it now
+        await run_async(release_claims, list(in_flight))
+    errors = len(results) - len(classified) + len(failed)
     
     elapsed = time.time() - start_time
     rate = processed / elapsed if elapsed > 0 else 0
     
     logger.info(f'Batch complete: {processed} processed, {errors} errors in {elapsed:.1f}s ({rate:.1f} posts/sec)')
+    logger.info(f'Rate limiter: {limiter.summary()}')
     return processed
 
 
+async def _refill_queue(queue: asyncio.Queue, in_flight: set, pending: list,
+                        stats: Dict[str, Any], continuous: bool):
+    """Keep the work queue topped up from Postgres until the backlog is empty."""
+    while True:
+        # Refill once the queue is half drained, so refills are a few larger queries
+        if queue.qsize() > queue.maxsize // 2:
+            await asyncio.sleep(0.2)
+            continue
+        
+        # Posts queued, being classified or awaiting a write stay leased to this worker, so claims skip them
+        limit = queue.maxsize - queue.qsize()
+        posts = await run_async(claim_posts, limit)
+        for post in posts:
+            in_flight.add(post['id'])
+            await queue.put(post)
+        
+        if posts:
+            continue
+        if continuous:
+            logger.info(f'No unprocessed posts, checking again in {STREAM_IDLE_SLEEP}s...')
+            await asyncio.sleep(STREAM_IDLE_SLEEP)
+        elif not in_flight:
+            return
+        else:
+            # Let in-flight posts finish and save, then check once more before deciding the backlog is done
+            await queue.join()
+            await _flush_results(pending, in_flight, stats)
+
+
+async def _flush_results(pending: list, in_flight: set, stats: Dict[str, Any]):
+    """Save every buffered classification in one batch write."""
+    if not pending:
+        return
+    # Take the buffer before awaiting so workers keep appending to a fresh one
+    results = pending[:]
+    pending.clear()
+    post_ids = [post_id for post_id, _ in results]
+    try:
+        saved, save_failed = await run_async(write_classifications, results)
+        stats['processed'] += saved
+    except Exception as e:
+        logger.error(f'Save error for {len(results)} posts: {e}')
+        save_failed = post_ids
+    # Their leases are left to expire, so they are retried after CLAIM_LEASE_SECONDS
+    stats['errors'] += len(save_failed)
+    in_flight.difference_update(post_ids)
+
+
+async def _flush_periodically(pending: list, in_flight: set, stats: Dict[str, Any]):
+    """Bound how long a finished classification waits for its batch to fill."""
+    while True:
+        await asyncio.sleep(WRITE_FLUSH_INTERVAL)
+        await _flush_results(pending, in_flight, stats)
+
+
+async def _renew_leases(in_flight: set):
+    """Keep claims on queued and in-progress posts alive so other workers don't take them."""
+    while True:
+        await asyncio.sleep(CLAIM_LEASE_SECONDS / 3)
+        await run_async(renew_claims, list(in_flight))
+
+
+async def _stream_worker(queue: asyncio.Queue, in_flight: set, pending: list,
+                         limiter: RateLimiter, stats: Dict[str, Any]):
+    """Classify posts as they come off the queue, buffering results for batch writes."""
+    while True:
+        post = await queue.get()
+        try:
+            post_id, classification, error = await classify_post_async(post, limiter)
+            if classification:
+                # Stays in in_flight (and leased) until saved
+                pending.append((post_id, classification))
+                if len(pending) >= WRITE_BATCH_SIZE:
+                    await _flush_results(pending, in_flight, stats)
+            else:
+                # The lease is left to expire, so the post is retried after CLAIM_LEASE_SECONDS
+                in_flight.discard(post_id)
+                stats['errors'] += 1
+        finally:
+            queue.task_done()
+
+
+async def _log_progress(stats: Dict[str, Any], queue: asyncio.Queue, limiter: RateLimiter):
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        elapsed = time.time() - stats['started']
+        rate = stats['processed'] / elapsed if elapsed > 0 else 0
+        logger.info(f'Streaming: {stats["processed"]} processed, {stats["errors"]} errors, '
+                    f'{queue.qsize()} queued ({rate:.1f} posts/sec) | {limiter.summary()}')
+
+
+async def process_stream_async(continuous: bool = False) -> int:
+    """Classify posts with MAX_CONCURRENT workers fed from a bounded queue, saving results in
+    batches of up to WRITE_BATCH_SIZE at least every WRITE_FLUSH_INTERVAL seconds.
+    Runs until the backlog is empty, or forever if continuous."""
+    logger.info(f'Streaming posts with {MAX_CONCURRENT} concurrent workers...')
+    
+    queue = asyncio.Queue(maxsize=max(STREAM_QUEUE_SIZE, MAX_CONCURRENT * 2))
+    limiter = get_limiter()
+    in_flight, pending = set(), []
+    stats = {'processed': 0, 'errors': 0, 'started': time.time()}
+    
+    workers = [
+        asyncio.create_task(_stream_worker(queue, in_flight, pending, limiter, stats))
+        for _ in range(MAX_CONCURRENT)
+    ]
+    background = [
+        asyncio.create_task(_log_progress(stats, queue, limiter)),
+        asyncio.create_task(_flush_periodically(pending, in_flight, stats)),
+        asyncio.create_task(_renew_leases(in_flight)),
+    ]
+    try:
+        await _refill_queue(queue, in_flight, pending, stats, continuous)
+        await queue.join()
+    finally:
+        for task in workers + background:
+            task.cancel()
+        await asyncio.gather(*workers, *background, return_exceptions=True)
+        # Save whatever finished before shutdown (or an interrupt) rather than paying for it again
+        await _flush_results(pending, in_flight, stats)
+        # Hand still-queued posts back so other workers needn't wait out the lease
+        await run_async(release_claims, list(in_flight))
+    
+    elapsed = time.time() - stats['started']
+    rate = stats['processed'] / elapsed if elapsed > 0 else 0
+    logger.info(f'Stream complete: {stats["processed"]} processed, {stats["errors"]} errors '
+                f'in {elapsed:.1f}s ({rate:.1f} posts/sec)')
+    logger.info(f'Rate limiter: {limiter.summary()}')
+    return stats['processed']
+
+
 def get_stats():
     """Get processing statistics."""
-    with get_db_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
                 SELECT 
@@ -330,6 +383,8 @@ if __name__ == '__main__':
     parser.add_argument('--batch', type=int, default=100, help='Batch size')
     parser.add_argument('--workers', type=int, default=10, help='Concurrent workers')
     parser.add_argument('--continuous', action='store_true', help='Run continuously')
+    parser.add_argument('--stream', action='store_true',
+                        help='Refill a bounded queue and save results in small batches as they complete, instead of batch waves')
     parser.add_argument('--stats', action='store_true', help='Show stats only')
     
     args = parser.parse_args()
@@ -342,6 +397,8 @@ if __name__ == '__main__':
         print(f'Processed: {stats["processed"]}')
         print(f'Pending: {stats["pending"]}')
         print(f'With text: {stats["with_text"]}')
+    elif args.stream:
+        asyncio.run(process_stream_async(continuous=args.continuous))
     elif args.continuous:
         asyncio.run(main_continuous(args.batch))
     else:
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Cannect Customer Intelligence - Database Connections
+Shared PostgreSQL connection pool for the classifier, sync service and profile builder.
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable
+
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool size; keep DB_POOL_MAX at or above the classifier's concurrent workers
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Process-wide connection pool, created on first use."""
+    global _pool, _pool_slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    host=os.getenv('DB_HOST', 'localhost'),
+                    port=int(os.getenv('DB_PORT', '5432')),
+                    database=os.getenv('DB_NAME', 'cannect_intel'),
+                    user=os.getenv('DB_USER', 'cci'),
+                    password=os.getenv('DB_PASSWORD', '')
+                )
+                # getconn() raises once the pool is exhausted; callers wait on this instead
+                _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+                logger.info(f'PostgreSQL pool ready ({DB_POOL_MIN}-{DB_POOL_MAX} connections)')
+    return _pool
+
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection. Commits on success, rolls back on error, and always returns it."""
+    pool = get_pool()
+    _pool_slots.acquire()
+    conn = None
+    try:
+        conn = pool.getconn()
+        yield conn
+        conn.commit()
+    except Exception:
+        if conn is not None and not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            # A connection the server dropped is discarded rather than handed out again
+            pool.putconn(conn, close=bool(conn.closed))
+        _pool_slots.release()
+
+
+async def run_async(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking database helper in a worker thread so the event loop keeps serving API calls."""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def close_pool():
+    """Close every pooled connection (e.g. at shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
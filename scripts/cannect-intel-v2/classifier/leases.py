@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Cannect Customer Intelligence - Work Leases
+Hands unprocessed posts to classifier workers without overlap. A worker claims posts with
+FOR UPDATE SKIP LOCKED and stamps claimed_at/claimed_by; other workers skip the post until it
+is processed or the lease runs out (e.g. the worker died), so no post is paid for twice.
+"""
+
+import os
+import socket
+import logging
+from typing import List
+
+from psycopg2.extras import RealDictCursor
+
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Seconds a claim holds before another worker may take the post; renew well inside this
+CLAIM_LEASE_SECONDS = int(os.getenv('CLAIM_LEASE_SECONDS', '600'))
+
+# Unique per process, across machines
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+_lease_columns_checked = False
+
+
+def ensure_lease_columns():
+    """Add posts.claimed_at/claimed_by on databases created before leasing."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # ALTER TABLE locks posts even when the columns exist, so check first
+            cur.execute("""
+                SELECT COUNT(*) FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'posts'
+                  AND column_name IN ('claimed_at', 'claimed_by')
+            """)
+            if cur.fetchone()[0] == 2:
+                return
+            cur.execute("""
+                ALTER TABLE posts
+                    ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ,
+                    ADD COLUMN IF NOT EXISTS claimed_by TEXT
+            """)
+            logger.info('Added posts.claimed_at/claimed_by for work leasing')
+
+
+def claim_posts(limit: int = 100) -> list:
+    """Claim up to limit unprocessed, unleased posts (newest first) for this worker."""
+    global _lease_columns_checked
+    if not _lease_columns_checked:
+        ensure_lease_columns()
+        _lease_columns_checked = True
+
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # SKIP LOCKED passes over rows another worker is claiming right now;
+            # the claimed_at check passes over rows it claimed earlier and still holds
+            cur.execute("""
+                WITH picked AS (
+                    SELECT id FROM posts
+                    WHERE processed_at IS NULL
+                      AND text_content IS NOT NULL
+                      AND text_content != ''
+                      AND (claimed_at IS NULL OR claimed_at < NOW() - make_interval(secs => %s))
+                    ORDER BY post_created_at DESC
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE posts SET claimed_at = NOW(), claimed_by = %s
+                FROM picked
+                WHERE posts.id = picked.id
+                RETURNING posts.id, posts.uri, posts.text_content, posts.has_media,
+                          posts.embed_type, posts.langs, posts.post_created_at
+            """, (CLAIM_LEASE_SECONDS, limit, WORKER_ID))
+            return sorted(cur.fetchall(), key=lambda post: post['post_created_at'], reverse=True)
+
+
+def renew_claims(post_ids: List[int]) -> int:
+    """Extend this worker's leases on post_ids. Returns how many it still held."""
+    if not post_ids:
+        return 0
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE posts SET claimed_at = NOW()
+                WHERE id = ANY(%s::bigint[]) AND claimed_by = %s AND processed_at IS NULL
+            """, (post_ids, WORKER_ID))
+            renewed = cur.rowcount
+    if renewed < len(post_ids):
+        logger.warning(f'{len(post_ids) - renewed} leases were lost or already processed')
+    return renewed
+
+
+def release_claims(post_ids: List[int]):
+    """Give up this worker's unfinished claims so other workers can take them now."""
+    if not post_ids:
+        return
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE posts SET claimed_at = NULL, claimed_by = NULL
+                WHERE id = ANY(%s::bigint[]) AND claimed_by = %s AND processed_at IS NULL
+            """, (post_ids, WORKER_ID))
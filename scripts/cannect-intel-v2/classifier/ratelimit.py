@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Cannect Customer Intelligence - DeepSeek Rate Control
+Token buckets for requests/min and tokens/min, plus a concurrency limit that grows while
+calls are fast and halves on 429s or latency spikes, so the classifier runs near quota
+without error storms.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Optional
+
+from openai import APIConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Account quota; the buckets keep us under it
+DEEPSEEK_RPM = float(os.getenv('DEEPSEEK_RPM', '600'))
+DEEPSEEK_TPM = float(os.getenv('DEEPSEEK_TPM', '1000000'))
+
+BURST_SECONDS = 10          # Bucket capacity, in seconds of quota, that may be spent at once
+LATENCY_EWMA = 0.3          # Smoothing for observed call latency
+LATENCY_FACTOR = 2.0        # Latency this many times the session best counts as a spike
+DECREASE_INTERVAL = 5.0     # Min seconds between two halvings, so one burst of 429s halves once
+PROBE_INTERVAL = 30.0       # Min seconds between attempts to go back above the limit that last drew a 429
+DEFAULT_RETRY_AFTER = 5.0   # Cooldown after a 429 that carries no Retry-After header
+MAX_RETRY_AFTER = 120.0
+RATE_LIMIT_RETRIES = 3      # Retries per call after a 429, each after the server's Retry-After
+TRANSIENT_RETRIES = 2       # Retries per call after a connection error, timeout or 5xx
+TRANSIENT_BACKOFF = (2.0, 10.0)  # Exponential backoff bounds for those, in seconds
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True for an HTTP 429 from the API client."""
+    return getattr(exc, 'status_code', None) == 429
+
+
+def is_transient(exc: BaseException) -> bool:
+    """True for connection errors, timeouts and 5xx responses, which are worth retrying."""
+    status = getattr(exc, 'status_code', None)
+    return isinstance(exc, (APIConnectionError, ConnectionError, TimeoutError)) or (status is not None and status >= 500)
+
+
+def retry_delay(exc: BaseException, attempt: int) -> Optional[float]:
+    """Seconds to sleep before retrying a call that failed with exc on attempt (0-based), or None to give up.
+    A 429 needs no sleep here: the limiter's Retry-After cooldown already holds the next call back."""
+    if is_rate_limited(exc):
+        return 0.0 if attempt < RATE_LIMIT_RETRIES else None
+    if is_transient(exc) and attempt < TRANSIENT_RETRIES:
+        low, high = TRANSIENT_BACKOFF
+        return min(high, low * 2 ** attempt)
+    return None
+
+
+def retry_after_seconds(exc: BaseException) -> float:
+    """Seconds the server asked us to wait, from the 429's Retry-After header."""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return min(MAX_RETRY_AFTER, max(0.0, float(headers.get('retry-after'))))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough request size for the token bucket (~4 chars/token plus the completion budget)."""
+    return len(prompt) // 4 + max_tokens
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 per second up to BURST_SECONDS worth. Spending may go negative;
+    the caller then waits off the debt, so large requests are never starved."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def spend(self, amount: float) -> float:
+        """Take amount now; returns the seconds to wait before using it. Call under the limiter lock."""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+    def refund(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Call:
+    """One rate-limited API call; report the real token usage with used() when known."""
+
+    def __init__(self, limiter: 'RateLimiter', estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.started = time.monotonic()
+
+    def used(self, total_tokens: Optional[int]):
+        if total_tokens is not None:
+            self.limiter._reconcile(self.estimated_tokens, total_tokens)
+
+
+class RateLimiter:
+    """Shared DeepSeek rate control: requests/min and tokens/min buckets, a Retry-After cooldown
+    and an AIMD concurrency limit between 1 and max_concurrency.
+
+        async with limiter.call(estimated_tokens) as call:
+            response = await client.chat.completions.create(...)
+            call.used(response.usage.total_tokens)
+    """
+
+    def __init__(self, max_concurrency: int = 10, requests_per_minute: float = DEEPSEEK_RPM,
+                 tokens_per_minute: float = DEEPSEEK_TPM):
+        self.max_concurrency = max_concurrency
+        # Start at the configured ceiling (the old fixed behaviour) and only back off on evidence
+        self.concurrency = float(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.latency = None
+        self.best_latency = None
+        self.last_decrease = 0.0
+        self.rate_limited_at = None
+        self.last_probe = 0.0
+        self.lock = threading.Lock()
+        self._slots = None
+        self._slots_loop = None
+        # Wait times are summed over calls, so they can exceed wall-clock time
+        self.stats = {'calls': 0, 'rate_limited': 0, 'decreases': 0, 'tokens': 0,
+                      'throttled_s': 0.0, 'queued_s': 0.0}
+
+    @property
+    def limit(self) -> int:
+        """Calls allowed in flight right now."""
+        return max(1, int(self.concurrency))
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """Spend from both buckets; seconds to wait for them and any 429 cooldown."""
+        with self.lock:
+            wait = max(self.requests.spend(1), self.tokens.spend(estimated_tokens))
+            return max(wait, self.blocked_until - time.monotonic())
+
+    def _reconcile(self, estimated_tokens: int, total_tokens: int):
+        with self.lock:
+            self.stats['tokens'] += total_tokens
+            if total_tokens < estimated_tokens:
+                self.tokens.refund(estimated_tokens - total_tokens)
+            else:
+                self.tokens.spend(total_tokens - estimated_tokens)
+
+    def _decrease(self, reason: str):
+        """Halve the concurrency limit, at most once per DECREASE_INTERVAL. Call under the lock."""
+        now = time.monotonic()
+        if self.concurrency <= 1 or now - self.last_decrease < DECREASE_INTERVAL:
+            return
+        self.last_decrease = now
+        self.concurrency = max(1.0, self.concurrency / 2)
+        self.stats['decreases'] += 1
+        logger.warning(f'DeepSeek {reason}: concurrency limit down to {self.limit}/{self.max_concurrency}')
+
+    def _record(self, latency: float, exc: Optional[BaseException]):
+        with self.lock:
+            self.stats['calls'] += 1
+            if exc is not None and is_rate_limited(exc):
+                self.stats['rate_limited'] += 1
+                self.rate_limited_at = min(self.limit, self.rate_limited_at or self.limit)
+                # Every caller waits out the server's cooldown, not just the one that got the 429
+                cooldown = retry_after_seconds(exc)
+                self.blocked_until = max(self.blocked_until, time.monotonic() + cooldown)
+                logger.warning(f'DeepSeek 429: pausing all calls for {cooldown:.1f}s')
+                self._decrease('429')
+                return
+            if exc is not None:
+                return
+
+            self.latency = latency if self.latency is None else \
+                LATENCY_EWMA * latency + (1 - LATENCY_EWMA) * self.latency
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+
+            if self.latency > self.best_latency * LATENCY_FACTOR:
+                self._decrease(f'latency {self.latency:.1f}s vs best {self.best_latency:.1f}s')
+                # Judge later spikes against the new level, so a lasting slowdown can't pin the limit at 1
+                self.best_latency = self.latency
+            else:
+                self._increase()
+
+    def _increase(self):
+        """Additive increase, about +1 every `limit` successful calls. Stepping up to the limit
+        that last drew a 429 is a probe, tried once per PROBE_INTERVAL. Call under the lock."""
+        grown = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        if self.rate_limited_at is not None and int(grown) >= self.rate_limited_at > self.limit:
+            now = time.monotonic()
+            if now - self.last_probe < PROBE_INTERVAL:
+                return
+            self.last_probe = now
+            # Allow one step past the ceiling; a 429 there puts it back via _record
+            self.rate_limited_at += 1
+        self.concurrency = grown
+
+    def _loop_slots(self) -> asyncio.Condition:
+        # asyncio primitives bind to one event loop; recreate if the caller runs a new one
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Condition()
+            self._slots_loop = loop
+        return self._slots
+
+    @asynccontextmanager
+    async def call(self, estimated_tokens: int = 0):
+        """Wait for a concurrency slot, the buckets and any cooldown, then run one API call."""
+        slots = self._loop_slots()
+        queued = time.monotonic()
+        async with slots:
+            await slots.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        self.stats['queued_s'] += time.monotonic() - queued
+
+        try:
+            wait = self._reserve(estimated_tokens)
+            if wait > 0:
+                self.stats['throttled_s'] += wait
+                await asyncio.sleep(wait)
+
+            call = Call(self, estimated_tokens)
+            try:
+                yield call
+            except BaseException as e:
+                self._record(time.monotonic() - call.started, e)
+                raise
+            self._record(time.monotonic() - call.started, None)
+        finally:
+            async with slots:
+                self.in_flight -= 1
+                slots.notify_all()
+
+    @contextmanager
+    def call_sync(self, estimated_tokens: int = 0):
+        """Blocking call() for the sequential classifier; no concurrency gate is needed there."""
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            with self.lock:
+                self.stats['throttled_s'] += wait
+            time.sleep(wait)
+
+        call = Call(self, estimated_tokens)
+        try:
+            yield call
+        except BaseException as e:
+            self._record(time.monotonic() - call.started, e)
+            raise
+        self._record(time.monotonic() - call.started, None)
+
+    def summary(self) -> str:
+        latency = f'{self.latency:.1f}s' if self.latency is not None else '-'
+        return (f'concurrency {self.limit}/{self.max_concurrency} | latency {latency} | '
+                f'{self.stats["calls"]} calls, {self.stats["rate_limited"]} rate limited, '
+                f'{self.stats["decreases"]} backoffs | throttled {self.stats["throttled_s"]:.0f}s, '
+                f'queued {self.stats["queued_s"]:.0f}s | {self.stats["tokens"]} tokens')
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, 'limit': self.limit, 'latency': self.latency}
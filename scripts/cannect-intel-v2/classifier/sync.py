@@ -12,10 +12,11 @@ import subprocess
 from datetime import datetime
 from typing import Optional
 
-import psycopg2
 from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
+from db import get_connection
+
 load_dotenv()
 
 logging.basicConfig(
@@ -30,17 +31,6 @@ LEGACY_DB_PATH = '/root/feed/data/posts.db'
 LOCAL_DB_COPY = '/tmp/posts_sync.db'
 
 
-def get_pg_connection():
-    """Get PostgreSQL connection."""
-    return psycopg2.connect(
-        host='localhost',
-        port=5432,
-        database='cannect_intel',
-        user='cci',
-        password='cci_secure_2026'
-    )
-
-
 def download_sqlite_db():
     """Download SQLite database from Legacy VPS."""
     logger.info(f'Downloading SQLite database from {LEGACY_VPS}...')
@@ -60,7 +50,7 @@ def download_sqlite_db():
 
 def get_last_sync_timestamp() -> Optional[datetime]:
     """Get the timestamp of the last synced post."""
-    with get_pg_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT MAX(indexed_at) FROM posts")
             result = cur.fetchone()[0]
@@ -117,7 +107,7 @@ def sync_posts():
     if not rows:
         logger.info('No new posts to sync')
         # Log sync
-        with get_pg_connection() as conn:
+        with get_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     INSERT INTO sync_log (completed_at, posts_synced, last_indexed_at, status)
@@ -162,7 +152,7 @@ def sync_posts():
         ))
     
     # Insert into PostgreSQL
-    with get_pg_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             execute_values(cur, """
                 INSERT INTO posts (
@@ -199,7 +189,7 @@ def sync_posts():
 
 def get_sync_stats():
     """Get sync statistics."""
-    with get_pg_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT 
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Cannect Customer Intelligence - Classification Writer
+Saves many classifications per transaction: one multi-row INSERT into post_classifications
+and one UPDATE ... FROM (VALUES ...) marking the posts processed.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, List, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Classifications saved per transaction
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '100'))
+
+# (column, default when the model omitted it); raw_response is appended last
+CLASSIFICATION_FIELDS = [
+    ('confidence', 80), ('processing_ms', None),
+    ('experience_level', None), ('consumer_type', None), ('lifestyle_tags', None),
+    ('occasion', None), ('setting', None), ('mood_before', None), ('mood_after', None),
+    ('time_of_day', None), ('is_ritual', False),
+    ('intent_type', None), ('purchase_intent', None), ('purchase_stage', None),
+    ('product_category', None), ('effects_mentioned', None), ('effects_desired', None),
+    ('quality_perception', None), ('dosage_pattern', None),
+    ('post_type', None), ('media_type', None),
+    ('sentiment', None), ('sentiment_score', None), ('emotions', None),
+    ('brand_mentioned', None), ('strain_mentioned', None), ('dispensary_mentioned', None),
+    ('price_mentioned', False), ('price_sentiment', None),
+    ('frustrations', None), ('region_hint', None), ('legal_context', None),
+    ('data_richness', None), ('business_value', None), ('audience_segments', None),
+]
+
+COLUMNS = ['post_id', 'model_version'] + [name for name, _ in CLASSIFICATION_FIELDS] + ['raw_response']
+
+INSERT_SQL = f"""
+    INSERT INTO post_classifications ({', '.join(COLUMNS)})
+    VALUES %s
+    ON CONFLICT (post_id, model_version) DO UPDATE SET
+        confidence = EXCLUDED.confidence,
+        processing_ms = EXCLUDED.processing_ms,
+        classified_at = NOW()
+"""
+
+MARK_PROCESSED_SQL = """
+    UPDATE posts SET processed_at = NOW(), classification_version = 1
+    FROM (VALUES %s) AS done (id)
+    WHERE posts.id = done.id
+"""
+
+
+def classification_row(post_id: int, classification: Dict) -> tuple:
+    """post_classifications values for one result, in COLUMNS order."""
+    return (
+        post_id,
+        classification['model_version'],
+        *(classification.get(name, default) for name, default in CLASSIFICATION_FIELDS),
+        json.dumps(classification)
+    )
+
+
+def save_classifications(results: List[Tuple[int, Dict]]) -> int:
+    """Insert the classifications and mark their posts processed in one transaction."""
+    # ON CONFLICT cannot touch the same row twice in one statement, so keep the last result per post
+    rows = {post_id: classification_row(post_id, c) for post_id, c in results}
+    if not rows:
+        return 0
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, INSERT_SQL, list(rows.values()), page_size=len(rows))
+            execute_values(cur, MARK_PROCESSED_SQL, [(post_id,) for post_id in rows],
+                           template='(%s::bigint)', page_size=len(rows))
+    return len(rows)
+
+
+def write_classifications(results: List[Tuple[int, Dict]]) -> Tuple[int, List[int]]:
+    """Save results in WRITE_BATCH_SIZE transactions. A batch the database rejects (e.g. one value
+    failing a CHECK constraint) is retried row by row so only the bad posts are lost.
+    Returns (saved, failed post ids)."""
+    saved, failed = 0, []
+    for i in range(0, len(results), WRITE_BATCH_SIZE):
+        chunk = results[i:i + WRITE_BATCH_SIZE]
+        try:
+            saved += save_classifications(chunk)
+            continue
+        except psycopg2.Error as e:
+            if len(chunk) == 1:
+                logger.error(f'Save error for post {chunk[0][0]}: {e}')
+                failed.append(chunk[0][0])
+                continue
+            logger.warning(f'Batch save of {len(chunk)} failed ({e}), retrying row by row')
+
+        for post_id, classification in chunk:
+            try:
+                saved += save_classifications([(post_id, classification)])
+            except psycopg2.Error as e:
+                logger.error(f'Save error for post {post_id}: {e}')
+                failed.append(post_id)
+    return saved, failed
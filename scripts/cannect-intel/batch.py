@@ -8,163 +8,643 @@ import sqlite3
 import subprocess
 import json
 import os
-import sys
+import asyncio
+import argparse
 from datetime import datetime
 import time
 from extractor import (
-    init_db, fetch_post_text, extract_insights, 
-    save_insight, get_processed_uris, INSIGHTS_DB
+    init_db, resolve_post_texts, try_extract_insights_batch,
+    save_insight, record_failure, get_store, get_ollama, get_cache, INSIGHTS_DB, GET_POSTS_MAX_URIS,
+    TERMINAL_REASONS
 )
+from throttle import AdaptiveThrottle
+from stats import compute_stats
 
 # Configuration
 POSTS_DB_PATH = "/root/cannect-intel/posts.db"  # Local copy of posts database
 BATCH_SIZE = 100  # Posts per session
-DELAY_BETWEEN_POSTS = 1  # seconds
+DELAY_BETWEEN_POSTS = 1  # seconds, starting point for the adaptive throttle
+PAGE_SIZE = 500  # Rows per keyset page when selecting unprocessed posts
+MIN_TEXT_LENGTH = 10  # Shorter posts are skipped
+POSTS_PER_PROMPT = 1  # Posts packed into one Ollama prompt
 
-def fetch_posts_from_db(limit=50000):
-    """Fetch post URIs from local posts database"""
-    print(f"Fetching posts from local database...")
+# Pipeline mode
+PIPELINE_CONCURRENCY = 2  # In-flight Ollama requests
+PIPELINE_QUEUE_SIZE = 50  # Max posts buffered between stages
+
+def _iter_posts(page_size=PAGE_SIZE, oldest_first=False, after=None):
+    """Yield (uri, text, indexed_at) for posts with no insight, no live lease and no pending retry backoff,
+    paging on (indexed_at, uri).
+    Newest first by default; after is an (indexed_at, uri) position to start behind"""
+    conn = sqlite3.connect(POSTS_DB_PATH)
+    conn.execute('ATTACH DATABASE ? AS intel', (INSIGHTS_DB,))
     
-    # Get already processed URIs
-    processed = get_processed_uris()
-    print(f"  Already processed: {len(processed)} posts")
+    # The anti-joins run against the insights.uri and claims.uri primary keys, so nothing is loaded into Python
+    query = '''
+        SELECT p.uri, p.text, p.indexed_at FROM posts p
+        WHERE {keyset}
+          NOT EXISTS (SELECT 1 FROM intel.insights i WHERE i.uri = p.uri)
+          AND NOT EXISTS (SELECT 1 FROM intel.claims c WHERE c.uri = p.uri AND c.expires_at > ?)
+          AND NOT EXISTS (SELECT 1 FROM intel.failed_extractions f
+                          WHERE f.uri = p.uri AND (f.terminal OR f.next_attempt_at > ?))
+        ORDER BY p.indexed_at {order}, p.uri {order}
+        LIMIT ?
+    '''
+    order, cmp = ('ASC', '>') if oldest_first else ('DESC', '<')
+    first_page = query.format(keyset='', order=order)
+    next_page = query.format(keyset=f'p.indexed_at {cmp}= ? AND (p.indexed_at {cmp} ? OR p.uri {cmp} ?) AND', order=order)
     
     try:
-        conn = sqlite3.connect(POSTS_DB_PATH)
-        c = conn.cursor()
-        c.execute('SELECT uri FROM posts ORDER BY indexed_at DESC LIMIT ?', (limit,))
-        uris = [row[0] for row in c.fetchall()]
+        last = after
+        while True:
+            if last is None:
+                now = time.time()
+                rows = conn.execute(first_page, (now, now, page_size)).fetchall()
+            else:
+                now = time.time()
+                rows = conn.execute(next_page, (last[0], last[0], last[1], now, now, page_size)).fetchall()
+            
+            yield from rows
+            
+            if len(rows) < page_size:
+                return
+            last = (rows[-1][2], rows[-1][0])
+    finally:
         conn.close()
-        
-        print(f"  Found {len(uris)} posts in database")
-        
-        # Filter out already processed
-        new_uris = [uri for uri in uris if uri not in processed]
-        print(f"  New posts to process: {len(new_uris)}")
-        
-        return new_uris
+
+
+def _claim_posts(rows, limit):
+    """Lease rows from _iter_posts page by page until limit are owned. Returns the owned rows, in order"""
+    store = get_store()
+    owned_rows = []
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(owned_rows) + len(page) < limit:
+            continue
+        # Another worker may have leased some of these since they were read; keep only what we win
+        owned = set(store.claim([r[0] for r in page]))
+        owned_rows.extend(r for r in page if r[0] in owned)
+        page = []
+        if len(owned_rows) >= limit:
+            break
+    if page:
+        owned = set(store.claim([r[0] for r in page]))
+        owned_rows.extend(r for r in page if r[0] in owned)
+    return owned_rows
+
+
+def fetch_posts_from_db(limit=BATCH_SIZE):
+    """Claim and return (uri, text) pairs for up to limit unprocessed posts from local posts database"""
+    print(f"Fetching posts from local database...")
+    
+    # This worker's previous batch is finished; buffered insights must be visible to the anti-join
+    get_store().release_claims()
+    
+    try:
+        rows = _claim_posts(_iter_posts(page_size=min(limit, PAGE_SIZE)), limit)
+        print(f"  New posts to process: {len(rows)} (leased to {get_store().worker_id})")
+        return [(uri, text) for uri, text, _ in rows]
     except Exception as e:
         print(f"  Error: {e}")
         return []
 
 
-def process_posts(uris, max_posts=BATCH_SIZE):
-    """Process a batch of posts"""
-    print(f"\n=== Processing up to {max_posts} posts ===")
+class BackfillCursor:
+    """Oldest-first (indexed_at, uri) position of the backfill, persisted in the progress ledger.
+    It only moves over a contiguous run of finished posts, and is buffered through the store so
+    it commits in the same transaction as the insights it covers.
+    There is one cursor, so only one worker may backfill at a time: it holds the LEASE claim"""
+    
+    KEY = 'backfill_cursor'
+    LEASE = 'backfill'  # Pseudo-URI in the claims table; expires with the holder's other leases
+    
+    def __init__(self, rows, barrier=None, end=None):
+        # rows: (uri, text, indexed_at) in walk order. barrier: (indexed_at, uri) of the oldest
+        # unfinished post this batch passed over (e.g. leased by another worker or waiting on a
+        # retry); the cursor stops short of it so the post is walked again. end: the last post
+        # before the barrier, which the cursor may reach once this batch's own posts are finished
+        self.keys = [(indexed_at, uri) for uri, _, indexed_at in rows
+                     if barrier is None or (indexed_at, uri) < barrier]
+        self.positions = {uri: i for i, (_, uri) in enumerate(self.keys)}
+        self.finished = set()
+        self.next = 0
+        if end is not None and (not self.keys or end > self.keys[-1]):
+            self.keys.append(end)
+            self.finished.add(end[1])
+            # With nothing of its own to finish, the batch passes over finished posts right away
+            self._advance()
+    
+    @classmethod
+    def load(cls):
+        """Persisted (indexed_at, uri), or None before the first backfill batch"""
+        value = get_store().get_progress(cls.KEY)
+        return tuple(json.loads(value)) if value else None
+    
+    def done(self, uri, reason=None):
+        """Mark a post extracted, skipped or failed with reason, advancing the cursor if it closes a gap.
+        A failure that will be retried holds the cursor back, so the backfill walks the post again
+        once its backoff is over instead of leaving it behind the cursor"""
+        if reason is not None and reason not in TERMINAL_REASONS:
+            position = self.positions.get(uri)
+            if position is not None and position >= self.next:
+                del self.keys[position:]
+            return
+        self.finished.add(uri)
+        self._advance()
+    
+    def _advance(self):
+        start = self.next
+        while self.next < len(self.keys) and self.keys[self.next][1] in self.finished:
+            self.next += 1
+        if self.next > start:
+            get_store().set_progress(self.KEY, json.dumps(self.keys[self.next - 1]))
+
+
+def _backfill_bounds(after):
+    """(barrier, end) for a backfill batch, as (indexed_at, uri) keys or None. barrier is the oldest post
+    after the cursor that is unprocessed, not dead-lettered and not leased to this worker (posts
+    waiting out a retry backoff count, so the cursor stays behind them until they are retried).
+    end is the newest post before the barrier, or after the cursor if there is no barrier;
+    every post from the cursor up to end is finished or leased to this worker"""
+    conn = sqlite3.connect(POSTS_DB_PATH)
+    conn.execute('ATTACH DATABASE ? AS intel', (INSIGHTS_DB,))
+    keyset = 'p.indexed_at >= ? AND (p.indexed_at > ? OR p.uri > ?) AND' if after else ''
+    try:
+        barrier = conn.execute(f'''
+            SELECT p.indexed_at, p.uri FROM posts p
+            WHERE {keyset}
+              NOT EXISTS (SELECT 1 FROM intel.insights i WHERE i.uri = p.uri)
+              AND NOT EXISTS (SELECT 1 FROM intel.claims c WHERE c.uri = p.uri AND c.worker = ?)
+              AND NOT EXISTS (SELECT 1 FROM intel.failed_extractions f WHERE f.uri = p.uri AND f.terminal)
+            ORDER BY p.indexed_at ASC, p.uri ASC
+            LIMIT 1
+        ''', (*((after[0], after[0], after[1]) if after else ()), get_store().worker_id)).fetchone()
+        before = 'WHERE indexed_at <= ? AND (indexed_at < ? OR uri < ?)' if barrier else ''
+        end = conn.execute(f'''
+            SELECT indexed_at, uri FROM posts {before}
+            ORDER BY indexed_at DESC, uri DESC
+            LIMIT 1
+        ''', (barrier[0], barrier[0], barrier[1]) if barrier else ()).fetchone()
+    finally:
+        conn.close()
+    barrier = tuple(barrier) if barrier else None
+    end = tuple(end) if end and (after is None or tuple(end) > after) else None
+    return barrier, end
+
+
+def fetch_backfill_posts(limit=BATCH_SIZE):
+    """Claim up to limit unprocessed posts after the backfill cursor, oldest first. Returns (posts, cursor);
+    no posts while another worker holds the backfill"""
+    print(f"Fetching backfill posts from local database...")
+    store = get_store()
+    store.release_claims()
+    
+    if not store.claim([BackfillCursor.LEASE]):
+        print(f"  Another worker is running the backfill; only one may hold the cursor")
+        return [], None
+    
+    after = BackfillCursor.load()
+    barrier = end = None
+    try:
+        rows = _claim_posts(_iter_posts(page_size=min(limit, PAGE_SIZE), oldest_first=True, after=after), limit)
+        # Read after claiming, so anything the walk skipped for another worker's lease shows up here
+        barrier, end = _backfill_bounds(after)
+    except Exception as e:
+        print(f"  Error: {e}")
+        rows = []
+    
+    print(f"  Resuming after {after[0] if after else 'the oldest post'}: {len(rows)} posts to process")
+    return [(uri, text) for uri, text, _ in rows], BackfillCursor(rows, barrier, end)
+
+
+def _extract_group(group, cursor=None):
+    """Extract and save a group of (uri, text) posts with one prompt. Returns (success, errors)"""
+    success = 0
+    errors = 0
+    
+    extract_start = time.time()
+    results = try_extract_insights_batch([text for _, text in group])
+    extract_time = time.time() - extract_start
+    
+    for (uri, text), (insights, reason) in zip(group, results):
+        if insights:
+            save_insight(uri, text, insights)
+            success += 1
+            product = insights.get('product') or 'no product'
+            mood = insights.get('mood') or '?'
+            print(f"  -> OK ({extract_time:.1f}s): {mood} | {product} | {uri[-20:]}")
+        else:
+            errors += 1
+            record_failure(uri, reason)
+            print(f"  -> FAILED ({extract_time:.1f}s, {reason}) | {uri[-20:]}")
+        if cursor:
+            cursor.done(uri, None if insights else reason)
+    
+    return success, errors
+
+
+def process_posts(posts, max_posts=BATCH_SIZE, posts_per_prompt=POSTS_PER_PROMPT, stop=None, cursor=None):
+    """Process a batch of (uri, text) posts. Setting the optional stop Event ends the batch early;
+    an optional BackfillCursor is advanced as posts finish"""
+    print(f"\n=== Processing up to {max_posts} posts ({posts_per_prompt} per prompt) ===")
     
     success = 0
     errors = 0
     skipped = 0
     
     start_time = datetime.now()
+    ollama_start = get_ollama().snapshot()
+    cache_start = get_cache().snapshot() if get_cache() else None
     
-    for i, uri in enumerate(uris[:max_posts]):
-        print(f"\n[{i+1}/{min(len(uris), max_posts)}] {uri[:70]}...")
+    # Use text from posts.db, only fetching from AT Protocol when it is empty
+    posts = posts[:max_posts]
+    missing = sum(1 for _, text in posts if not text)
+    if missing:
+        print(f"Fetching {missing} posts with no local text...")
+    posts, fetch_failed = resolve_post_texts(posts)
+    
+    # Inter-request delay adapts to load and Ollama latency instead of a fixed sleep
+    throttle = AdaptiveThrottle(max_concurrency=1, delay=DELAY_BETWEEN_POSTS)
+    get_ollama().on_latency = throttle.record
+    
+    group = []
+    for i, (uri, text) in enumerate(posts):
+        if stop is not None and stop.is_set():
+            print("\nStop requested, ending batch early")
+            break
+        
+        print(f"\n[{i+1}/{len(posts)}] {uri[:70]}...")
         
-        # Fetch post text from AT Protocol
-        text = fetch_post_text(uri)
-        if not text:
+        if uri in fetch_failed:
+            # The post may well exist; retried with backoff but never dead-lettered for this
+            print("  -> Skipped (fetch failed)")
+            skipped += 1
+            record_failure(uri, 'fetch_error')
+            if cursor:
+                cursor.done(uri, 'fetch_error')
+        elif not text:
             print("  -> Skipped (no text)")
             skipped += 1
-            continue
-        
-        if len(text) < 10:
+            record_failure(uri, 'no_text')
+            if cursor:
+                cursor.done(uri, 'no_text')
+        elif len(text) < MIN_TEXT_LENGTH:
             print(f"  -> Skipped (too short: '{text}')")
             skipped += 1
-            continue
-        
-        print(f"  Text: {text[:60]}...")
-        
-        # Extract insights
-        extract_start = time.time()
-        insights = extract_insights(text)
-        extract_time = time.time() - extract_start
-        
-        if insights:
-            save_insight(uri, text, insights)
-            success += 1
-            product = insights.get('product') or 'no product'
-            mood = insights.get('mood') or '?'
-            print(f"  -> OK ({extract_time:.1f}s): {mood} | {product}")
+            record_failure(uri, 'too_short')
+            if cursor:
+                cursor.done(uri, 'too_short')
         else:
-            errors += 1
-            print(f"  -> FAILED ({extract_time:.1f}s)")
+            print(f"  Text: {text[:60]}...")
+            group.append((uri, text))
         
-        # Delay between posts
-        time.sleep(DELAY_BETWEEN_POSTS)
+        # Extract insights once a full group is ready (or at the end)
+        if group and (len(group) >= posts_per_prompt or i == len(posts) - 1):
+            ok, failed = _extract_group(group, cursor)
+            success += ok
+            errors += failed
+            group = []
+            get_store().renew_claims()
+            
+            # Delay between prompts
+            throttle.pause()
     
+    get_ollama().on_latency = None
     end_time = datetime.now()
     duration = (end_time - start_time).total_seconds()
+    get_store().log_session(start_time, end_time, success, errors,
+                            get_ollama().since(ollama_start), get_ollama().structured)
     
     print(f"\n=== Session Complete ===")
     print(f"Duration: {duration/60:.1f} minutes")
     print(f"Processed: {success} successful, {errors} errors, {skipped} skipped")
     print(f"Rate: {success/(duration/60):.1f} posts/minute")
+    print(f"Throttle: {throttle.summary()}")
+    print(f"Ollama: {get_ollama().summary(since=ollama_start)}")
+    if cache_start is not None:
+        print(f"Cache: {get_cache().summary(since=cache_start)}")
     
     return success, errors, skipped
 
 
-def show_stats():
-    """Show current processing statistics"""
-    conn = sqlite3.connect(INSIGHTS_DB)
-    c = conn.cursor()
+class StageMeter:
+    """Item count and per-call latency for one pipeline stage"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.latencies = []
+        self.started = None
+        self.finished = None
+    
+    def record(self, seconds, items=1):
+        now = time.time()
+        if self.started is None:
+            self.started = now - seconds
+        self.finished = now
+        self.items += items
+        self.latencies.append(seconds)
+    
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
     
-    # Total processed
-    c.execute('SELECT COUNT(*) FROM insights')
-    total = c.fetchone()[0]
+    def rate(self):
+        """Items per minute over the stage's active span"""
+        if not self.items or self.finished == self.started:
+            return 0.0
+        return self.items / ((self.finished - self.started) / 60)
+    
+    def summary(self):
+        return (f"{self.name:<8} {self.items:5} posts | {self.rate():7.1f}/min | "
+                f"p50 {self.percentile(50):.2f}s p95 {self.percentile(95):.2f}s")
+
+
+async def _fetch_stage(posts, extract_queue, meter, counts, stop, cursor):
+    """Resolve texts in getPosts-sized chunks and feed the extract queue"""
+    for i in range(0, len(posts), GET_POSTS_MAX_URIS):
+        if stop is not None and stop.is_set():
+            print("Stop requested, draining queued posts")
+            return
+        chunk = posts[i:i + GET_POSTS_MAX_URIS]
+        start = time.time()
+        chunk, fetch_failed = await asyncio.to_thread(resolve_post_texts, chunk)
+        meter.record(time.time() - start, len(chunk))
+        
+        for uri, text in chunk:
+            if uri in fetch_failed or not text or len(text) < MIN_TEXT_LENGTH:
+                counts['skipped'] += 1
+                reason = 'fetch_error' if uri in fetch_failed else 'too_short' if text else 'no_text'
+                record_failure(uri, reason)
+                if cursor:
+                    cursor.done(uri, reason)
+                continue
+            await extract_queue.put((uri, text))
+
+
+async def _extract_stage(index, extract_queue, write_queue, meter, counts, posts_per_prompt, throttle, cursor):
+    """Run one Ollama request at a time off the extract queue, while the throttle allows this worker"""
+    while True:
+        # Workers above the throttle's current limit sit idle until it grows again
+        while index >= throttle.limit:
+            throttle.adjust()
+            await asyncio.sleep(1)
+        
+        item = await extract_queue.get()
+        
+        # Top up the group with whatever is already queued, without waiting
+        group = [item]
+        while len(group) < posts_per_prompt and not extract_queue.empty():
+            group.append(extract_queue.get_nowait())
+        
+        try:
+            await throttle.pause_async()
+            start = time.time()
+            try:
+                results = await asyncio.to_thread(try_extract_insights_batch, [text for _, text in group])
+                get_store().renew_claims()
+            except Exception as e:
+                # One bad group must not take the worker down with it; its posts go to the retry queue
+                print(f"  Extract error for {len(group)} posts: {e}")
+                results = [(None, 'extract_error')] * len(group)
+            elapsed = time.time() - start
+            meter.record(elapsed, len(group))
+            
+            for (uri, text), (insights, reason) in zip(group, results):
+                if insights:
+                    await write_queue.put((uri, text, insights))
+                else:
+                    counts['errors'] += 1
+                    record_failure(uri, reason)
+                    print(f"  FAILED ({elapsed:.1f}s, {reason}): {uri[:70]}")
+                    if cursor:
+                        cursor.done(uri, reason)
+        finally:
+            for _ in group:
+                extract_queue.task_done()
+
+
+async def _write_stage(write_queue, meter, counts, cursor):
+    """Persist extracted insights as they arrive"""
+    while True:
+        item = await write_queue.get()
+        if item is None:
+            return
+        
+        uri, text, insights = item
+        start = time.time()
+        try:
+            save_insight(uri, text, insights)
+        except Exception as e:
+            print(f"  Save error for {uri[:70]}: {e}")
+            counts['errors'] += 1
+            record_failure(uri, 'save_error')
+            if cursor:
+                cursor.done(uri, 'save_error')
+            continue
+        if cursor:
+            cursor.done(uri)
+        meter.record(time.time() - start)
+        counts['success'] += 1
+        
+        product = insights.get('product') or 'no product'
+        mood = insights.get('mood') or '?'
+        print(f"  OK: {mood} | {product} | {uri[:50]}")
+
+
+async def _run_pipeline(posts, concurrency, posts_per_prompt, throttle, stop, cursor=None):
+    extract_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    write_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    meters = [StageMeter('fetch'), StageMeter('extract'), StageMeter('write')]
+    counts = {'success': 0, 'errors': 0, 'skipped': 0}
     
-    # By mood
-    c.execute('SELECT mood, COUNT(*) FROM insights WHERE mood IS NOT NULL GROUP BY mood ORDER BY COUNT(*) DESC LIMIT 10')
-    moods = c.fetchall()
+    writer = asyncio.create_task(_write_stage(write_queue, meters[2], counts, cursor))
+    extractors = [
+        asyncio.create_task(_extract_stage(i, extract_queue, write_queue, meters[1], counts,
+                                           posts_per_prompt, throttle, cursor))
+        for i in range(concurrency)
+    ]
     
-    # By product (non-null)
-    c.execute('SELECT product, COUNT(*) FROM insights WHERE product IS NOT NULL AND product != "null" GROUP BY product ORDER BY COUNT(*) DESC LIMIT 10')
-    products = c.fetchall()
+    async def drain():
+        await _fetch_stage(posts, extract_queue, meters[0], counts, stop, cursor)
+        await extract_queue.join()
     
-    # By location
-    c.execute('SELECT location, COUNT(*) FROM insights WHERE location IS NOT NULL AND location != "null" GROUP BY location ORDER BY COUNT(*) DESC LIMIT 10')
-    locations = c.fetchall()
+    # Stage workers only ever finish by raising, so whichever task completes first is either the
+    # drain (all posts extracted) or a dead stage; a dead stage aborts the run instead of hanging it
+    drained = asyncio.create_task(drain())
+    done, _ = await asyncio.wait([drained, writer, *extractors], return_when=asyncio.FIRST_COMPLETED)
+    if drained not in done:
+        for task in [drained, writer, *extractors]:
+            task.cancel()
+        await asyncio.gather(drained, writer, *extractors, return_exceptions=True)
+        failed = next(iter(done))
+        raise RuntimeError('pipeline stage died') from (None if failed.cancelled() else failed.exception())
     
+    # Once every queued post is extracted, idle or throttled workers can simply be cancelled
+    for task in extractors:
+        task.cancel()
+    for result in await asyncio.gather(*extractors, return_exceptions=True):
+        if not isinstance(result, asyncio.CancelledError):
+            raise RuntimeError('extract stage died') from result
+    
+    await write_queue.put(None)
+    await writer
+    
+    start = time.time()
+    flushed = get_store().flush()
+    if flushed:
+        meters[2].record(time.time() - start, 0)
+    
+    return counts, meters
+
+
+def process_posts_pipeline(posts, max_posts=BATCH_SIZE, concurrency=PIPELINE_CONCURRENCY,
+                           posts_per_prompt=POSTS_PER_PROMPT, stop=None, cursor=None):
+    """Process a batch of (uri, text) posts with concurrent fetch, extract and write stages.
+    Setting the optional stop Event stops fetching; posts already queued are still finished.
+    An optional BackfillCursor is advanced as posts finish, in whatever order they complete"""
+    print(f"\n=== Pipelining up to {max_posts} posts ({concurrency} in-flight extractions, "
+          f"{posts_per_prompt} per prompt) ===")
+    
+    start_time = datetime.now()
+    ollama_start = get_ollama().snapshot()
+    cache_start = get_cache().snapshot() if get_cache() else None
+    
+    # Concurrency starts at 1 and grows towards the requested maximum while load allows
+    throttle = AdaptiveThrottle(max_concurrency=concurrency, delay=0)
+    get_ollama().on_latency = throttle.record
+    try:
+        counts, meters = asyncio.run(_run_pipeline(posts[:max_posts], concurrency, posts_per_prompt, throttle, stop, cursor))
+    finally:
+        get_ollama().on_latency = None
+    end_time = datetime.now()
+    duration = (end_time - start_time).total_seconds()
+    get_store().log_session(start_time, end_time, counts['success'], counts['errors'],
+                            get_ollama().since(ollama_start), get_ollama().structured)
+    
+    print(f"\n=== Session Complete ===")
+    print(f"Duration: {duration/60:.1f} minutes")
+    print(f"Processed: {counts['success']} successful, {counts['errors']} errors, {counts['skipped']} skipped")
+    print("Stage throughput:")
+    for meter in meters:
+        print(f"  {meter.summary()}")
+    print(f"Throttle: {throttle.summary()}")
+    print(f"Ollama: {get_ollama().summary(since=ollama_start)}")
+    if cache_start is not None:
+        print(f"Cache: {get_cache().summary(since=cache_start)}")
+    
+    return counts['success'], counts['errors'], counts['skipped']
+
+
+def show_stats(as_json=False):
+    """Show current processing statistics"""
+    stats = compute_stats(INSIGHTS_DB, top={'moods': 10, 'products': 10, 'locations': 10}, samples=0)
+    
+    # Parse failures per model version
+    conn = sqlite3.connect(INSIGHTS_DB)
+    c = conn.cursor()
+    c.execute('''
+        SELECT model_version, SUM(requests), SUM(parse_failures), SUM(wasted_tokens)
+        FROM extraction_log WHERE model_version IS NOT NULL
+        GROUP BY model_version ORDER BY MAX(id) DESC
+    ''')
+    parse_stats = c.fetchall()
+    c.execute('''
+        SELECT reason, SUM(terminal), SUM(NOT terminal), SUM(attempts)
+        FROM failed_extractions GROUP BY reason ORDER BY COUNT(*) DESC
+    ''')
+    failure_stats = c.fetchall()
     conn.close()
     
+    if as_json:
+        stats['parse_failures'] = [
+            {'model_version': model, 'requests': requests, 'parse_failures': failures, 'wasted_tokens': wasted}
+            for model, requests, failures, wasted in parse_stats
+        ]
+        stats['failed_extractions'] = [
+            {'reason': reason, 'dead_lettered': dead, 'awaiting_retry': waiting, 'attempts': attempts}
+            for reason, dead, waiting, attempts in failure_stats
+        ]
+        print(json.dumps(stats, indent=2))
+        return
+    
     print(f"\n=== Cannect Intelligence Stats ===")
-    print(f"Total posts analyzed: {total}")
+    print(f"Total posts analyzed: {stats['total']}")
     
+    moods = [(mood, count) for mood, count in stats['moods'] if mood is not None]
     if moods:
         print(f"\nTop Moods:")
         for mood, count in moods:
             print(f"  {mood}: {count}")
     
-    if products:
+    if stats['products']:
         print(f"\nTop Products Mentioned:")
-        for product, count in products:
+        for product, count in stats['products']:
             print(f"  {product}: {count}")
     
-    if locations:
+    if stats['locations']:
         print(f"\nTop Locations:")
-        for loc, count in locations:
+        for loc, count in stats['locations']:
             print(f"  {loc}: {count}")
+    
+    if parse_stats:
+        print(f"\nParse Failures by Model:")
+        for model, requests, failures, wasted in parse_stats:
+            rate = 100 * failures / requests if requests else 0
+            print(f"  {model}: {failures}/{requests} requests ({rate:.1f}%), {wasted} tokens wasted")
+    
+    if failure_stats:
+        print(f"\nFailed Extractions:")
+        for reason, dead, waiting, attempts in failure_stats:
+            print(f"  {reason}: {dead} dead-lettered, {waiting} awaiting retry ({attempts} attempts)")
 
 
 if __name__ == '__main__':
-    init_db()
+    parser = argparse.ArgumentParser(description='Cannect Intelligence batch processor')
+    parser.add_argument('command', nargs='?', choices=['run', 'stats'])
+    parser.add_argument('count', nargs='?', type=int, default=BATCH_SIZE, help='Posts to process (default 100)')
+    parser.add_argument('--pipeline', action='store_true', help='Run fetch, extract and write as concurrent stages')
+    parser.add_argument('--concurrency', type=int, default=PIPELINE_CONCURRENCY, help='Max in-flight Ollama requests in pipeline mode')
+    parser.add_argument('--posts-per-prompt', type=int, default=POSTS_PER_PROMPT, help='Posts packed into one Ollama prompt')
+    parser.add_argument('--structured', action='store_true', help='Constrain Ollama output with a JSON schema')
+    parser.add_argument('--json', action='store_true', help='Print stats as JSON')
+    parser.add_argument('--backfill', action='store_true', help='Walk posts oldest-first from the saved backfill cursor (one worker at a time)')
+    args = parser.parse_args()
     
-    if len(sys.argv) > 1:
-        if sys.argv[1] == 'stats':
-            show_stats()
-        elif sys.argv[1] == 'run':
-            batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else BATCH_SIZE
-            uris = fetch_posts_from_db(limit=5000)
-            if uris:
-                process_posts(uris, max_posts=batch_size)
-                show_stats()
+    init_db(verbose=not args.json)
+    
+    if args.command == 'stats':
+        show_stats(as_json=args.json)
+    elif args.command == 'run':
+        cursor = None
+        if args.backfill:
+            posts, cursor = fetch_backfill_posts(limit=args.count)
+        else:
+            posts = fetch_posts_from_db(limit=args.count)
+        if posts:
+            if args.structured:
+                get_ollama().structured = True
+            get_ollama().warm_up()
+            if args.pipeline:
+                process_posts_pipeline(posts, max_posts=args.count, concurrency=args.concurrency,
+                                       posts_per_prompt=args.posts_per_prompt, cursor=cursor)
             else:
-                print("No posts to process")
+                process_posts(posts, max_posts=args.count, posts_per_prompt=args.posts_per_prompt, cursor=cursor)
+            show_stats()
         else:
-            print(f"Unknown command: {sys.argv[1]}")
+            print("No posts to process")
     else:
         print("Usage:")
-        print("  python batch.py stats     - Show current statistics")
-        print("  python batch.py run [N]   - Process N posts (default 100)")
+        print("  python batch.py stats                     - Show current statistics")
+        print("  python batch.py run [N]                   - Process N posts (default 100)")
+        print("  python batch.py run [N] --pipeline [--concurrency C]")
+        print("                                            - Process N posts with C in-flight extractions")
+        print("  python batch.py run [N] --posts-per-prompt K")
+        print("                                            - Pack K posts into each Ollama prompt")
+        print("  python batch.py run [N] --structured      - Use schema-constrained JSON output")
+        print("  python batch.py run [N] --backfill        - Resume the oldest-first backfill from its cursor")
         print(f"\nCurrent stats:")
         show_stats()
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Cannect Intelligence - Benchmarks
+Reproducible timings against synthetic data; results are printed as JSON.
+
+  python benchmark.py stats [--rows 1000000]
+  python benchmark.py pipeline [--batch-sizes 100,500] [--concurrency 1,2,4] [--baseline old.json]
+
+The pipeline benchmark runs batch.py's fetch -> extract -> save stages against local stub
+XRPC and Ollama servers, so no Bluesky access or model is needed.
+"""
+
+import io
+import os
+import math
+import re
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import shutil
+import tempfile
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import extractor
+import stats
+import batch
+from throttle import AdaptiveThrottle
+
+# Synthetic value pools, with the case variants and null placeholders the model really emits
+MOODS = ['positive', 'negative', 'neutral', 'curious', 'excited', 'frustrated', 'Positive', 'Neutral', None]
+PRODUCTS = ['Blue Dream', 'blue dream', 'OG Kush', 'og kush', 'Gorilla Glue', 'Sour Diesel', 'gummies',
+            'vape pen', 'pre-roll', 'edibles', 'null', 'None', 'no product', ''] + [f'Strain {i}' for i in range(500)]
+LOCATIONS = ['California', 'california', 'Colorado', 'Denver', 'Toronto', 'Oregon', 'Michigan',
+             'null', 'None', ''] + [f'City {i}' for i in range(300)]
+POST_TYPES = ['question', 'review', 'news', 'personal', 'promotion', 'discussion', None]
+
+# The GROUP BYs stats.py ran before the normalized columns existed
+LEGACY_QUERIES = [
+    'SELECT COUNT(*) FROM insights',
+    'SELECT mood, COUNT(*) FROM insights GROUP BY mood ORDER BY COUNT(*) DESC LIMIT 15',
+    'SELECT product, COUNT(*) FROM insights WHERE product IS NOT NULL GROUP BY product ORDER BY COUNT(*) DESC LIMIT 30',
+    'SELECT location, COUNT(*) FROM insights WHERE location IS NOT NULL GROUP BY location ORDER BY COUNT(*) DESC LIMIT 25',
+    'SELECT post_type, COUNT(*) FROM insights GROUP BY post_type ORDER BY COUNT(*) DESC',
+    '''SELECT product, mood, substr(post_text, 1, 80) FROM insights
+       WHERE product IS NOT NULL AND product NOT IN ('null', 'no product', 'None', '') LIMIT 10''',
+]
+
+
+def make_insights_db(path, rows, seed=0):
+    """Insights table in its original (pre-migration) schema, filled with synthetic rows"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE insights (
+            uri TEXT PRIMARY KEY,
+            post_text TEXT,
+            product TEXT,
+            location TEXT,
+            mood TEXT,
+            post_type TEXT,
+            keywords TEXT,
+            extracted_at TEXT,
+            model_version TEXT
+        )
+    ''')
+    chunk = []
+    for i in range(rows):
+        product = rng.choice(PRODUCTS) if rng.random() < 0.4 else None
+        location = rng.choice(LOCATIONS) if rng.random() < 0.2 else None
+        chunk.append((
+            f'at://did:plc:bench{i % 1000}/app.bsky.feed.post/{i:010d}',
+            f'synthetic post {i} about {product or "nothing"} in {location or "nowhere"} ' * 3,
+            product,
+            location,
+            rng.choice(MOODS),
+            rng.choice(POST_TYPES),
+            json.dumps(['cannabis', 'bench']),
+            f'2026-01-01T00:00:{i % 60:02d}',
+            extractor.MODEL
+        ))
+        if len(chunk) == 10000:
+            conn.executemany('INSERT INTO insights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', chunk)
+            chunk = []
+    if chunk:
+        conn.executemany('INSERT INTO insights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', chunk)
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat):
+    """Best-of-N wall time in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 1)
+
+
+def run_legacy_queries(path):
+    conn = sqlite3.connect(path)
+    for sql in LEGACY_QUERIES:
+        conn.execute(sql).fetchall()
+    conn.close()
+
+
+def bench_stats(rows, repeat, keep=None):
+    """Legacy stats queries vs. compute_stats after the init_db migration, on one synthetic DB"""
+    workdir = tempfile.mkdtemp(prefix='cannect-bench-')
+    path = keep or os.path.join(workdir, 'insights.db')
+
+    start = time.perf_counter()
+    make_insights_db(path, rows)
+    build_s = time.perf_counter() - start
+
+    legacy_ms = timed(lambda: run_legacy_queries(path), repeat)
+
+    # Migration: new columns, chunked backfill, indexes
+    extractor.INSIGHTS_DB = path
+    start = time.perf_counter()
+    extractor.init_db(verbose=False)
+    migrate_s = time.perf_counter() - start
+
+    new_ms = timed(lambda: stats.compute_stats(path), repeat)
+
+    conn = sqlite3.connect(path)
+    plans = {
+        column: ' / '.join(row[3] for row in conn.execute(
+            f'EXPLAIN QUERY PLAN SELECT {column}, COUNT(*) FROM insights {where} GROUP BY {column}'
+        ))
+        for column, where in [('mood', ''), ('product_norm', 'WHERE product_norm IS NOT NULL'),
+                              ('location_norm', 'WHERE location_norm IS NOT NULL'), ('post_type', '')]
+    }
+    conn.close()
+
+    result = {
+        'benchmark': 'stats',
+        'rows': rows,
+        'repeat': repeat,
+        'db_bytes': os.path.getsize(path),
+        'build_s': round(build_s, 2),
+        'migration_s': round(migrate_s, 2),
+        'legacy_queries_ms': legacy_ms,
+        'compute_stats_ms': new_ms,
+        'speedup': round(legacy_ms / new_ms, 2) if new_ms else None,
+        'query_plans': plans,
+        'db_path': path if keep else None,
+    }
+    shutil.rmtree(workdir)
+    return result
+
+
+def sample_latency(mean_ms, distribution, rng):
+    """One latency in seconds with the given mean: fixed, uniform (±50%), exponential or lognormal"""
+    if mean_ms <= 0:
+        return 0.0
+    if distribution == 'uniform':
+        ms = rng.uniform(mean_ms * 0.5, mean_ms * 1.5)
+    elif distribution == 'exponential':
+        ms = rng.expovariate(1 / mean_ms)
+    elif distribution == 'lognormal':
+        # sigma 0.5 gives a long right tail; mu is chosen so the mean stays mean_ms
+        ms = rng.lognormvariate(math.log(mean_ms) - 0.125, 0.5)
+    else:
+        ms = mean_ms
+    return ms / 1000
+
+
+class StubServer:
+    """Local HTTP server on a free port, serving handler_class from a daemon thread"""
+
+    def __init__(self, handler_class, **config):
+        handler = type(handler_class.__name__, (handler_class,), {'config': config, 'rng': random.Random(0)})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Otherwise keep-alive responses pick up ~40ms of delayed-ACK latency
+    config = {}
+    rng = random
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def wait(self, mean_ms):
+        time.sleep(sample_latency(mean_ms, self.config['distribution'], self.rng))
+
+    def failed(self, rate):
+        return rate > 0 and self.rng.random() < rate
+
+    def log_message(self, *args):
+        pass
+
+
+class StubXrpcHandler(StubHandler):
+    """app.bsky.feed.getPosts returning synthetic text for every requested URI"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.endswith('app.bsky.feed.getPosts'):
+            return self.send_json({'error': 'MethodNotImplemented'}, 501)
+        self.wait(self.config['latency_ms'])
+        if self.failed(self.config['error_rate']):
+            return self.send_json({'error': 'InternalServerError'}, 500)
+        uris = parse_qs(url.query).get('uris', [])
+        self.send_json({'posts': [{'uri': uri, 'record': {'text': synthetic_text(uri)}} for uri in uris]})
+
+
+class StubOllamaHandler(StubHandler):
+    """/api/generate answering single and [index]-batched extraction prompts, with a fixed number of slots"""
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/api/tags':
+            return self.send_json({'error': 'not found'}, 404)
+        self.send_json({'models': [{'name': extractor.MODEL}]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = body.get('prompt', '')
+        if not prompt:
+            return self.send_json({'response': '', 'load_duration': 0})
+
+        indexes = [int(i) for i in re.findall(r'^\[(\d+)\]', prompt, re.M)]
+        # Like Ollama's OLLAMA_NUM_PARALLEL: requests beyond the slot count queue for a slot
+        with self.config['slots']:
+            self.wait(self.config['latency_ms'] + self.config['per_post_ms'] * max(0, len(indexes) - 1))
+        if self.failed(self.config['error_rate']):
+            return self.send_json({'error': 'model runner crashed'}, 500)
+
+        if self.failed(self.config['garbage_rate']):
+            response = 'Sorry, I cannot help with that.'
+        elif indexes:
+            items = [{'index': i, **self.insight()} for i in indexes]
+            response = json.dumps({'posts': items} if body.get('format') else items)
+        else:
+            response = json.dumps(self.insight())
+        eval_count = 40 * max(1, len(indexes))
+        self.send_json({
+            'response': response,
+            'load_duration': 1_000_000,
+            'prompt_eval_count': len(prompt) // 4,
+            'prompt_eval_duration': 2_000_000,
+            'eval_count': eval_count,
+            'eval_duration': eval_count * 100_000,
+        })
+
+    def insight(self):
+        product = self.rng.choice(PRODUCTS[:10] + [None])
+        return {
+            'product': product,
+            'location': self.rng.choice(LOCATIONS[:7] + [None, None]),
+            'mood': self.rng.choice(MOODS[:6]),
+            'type': self.rng.choice(POST_TYPES[:6]),
+            'keywords': self.rng.sample(['cannabis', 'thc', 'cbd', 'sleep', 'pain', 'edibles', 'kush'], 3),
+        }
+
+
+def synthetic_text(uri):
+    """Unique post text per URI, so the extraction cache never short-circuits the model"""
+    return f'Post {uri.rsplit("/", 1)[-1]}: trying some new flower tonight, anyone tried it for sleep?'
+
+
+def synthetic_posts(n, remote_fraction, seed=0):
+    """(uri, text) pairs; remote_fraction of them have no local text and go through getPosts"""
+    rng = random.Random(seed)
+    posts = []
+    for i in range(n):
+        uri = f'at://did:plc:bench{i % 100}/app.bsky.feed.post/{i:010d}'
+        posts.append((uri, '' if rng.random() < remote_fraction else synthetic_text(uri)))
+    return posts
+
+
+def _percentiles_ms(meter):
+    return {
+        'items': meter.items,
+        'calls': len(meter.latencies),
+        'p50_ms': round(meter.percentile(50) * 1000, 2),
+        'p95_ms': round(meter.percentile(95) * 1000, 2),
+    }
+
+
+class FixedThrottle(AdaptiveThrottle):
+    """Throttle pinned at max_concurrency with no delay, so short runs measure the configured level"""
+
+    def __init__(self, max_concurrency):
+        super().__init__(max_concurrency=max_concurrency, delay=0)
+        self.concurrency = float(max_concurrency)
+
+    def adjust(self, force=False):
+        pass
+
+
+def run_pipeline_once(posts, concurrency, posts_per_prompt, db_path, adaptive=False):
+    """One batch.py pipeline run against a fresh insights DB. Returns its metrics"""
+    extractor.INSIGHTS_DB = db_path
+    extractor._store = extractor._ollama = extractor._cache = None
+    extractor.init_db(verbose=False)
+
+    client = extractor.get_ollama()
+    # The real controller starts at 1 in flight and grows every few seconds, which dominates short runs
+    throttle = AdaptiveThrottle(max_concurrency=concurrency, delay=0) if adaptive else FixedThrottle(concurrency)
+    client.on_latency = throttle.record
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        counts, meters = asyncio.run(batch._run_pipeline(posts, concurrency, posts_per_prompt, throttle, None))
+    wall = time.perf_counter() - start
+
+    client.on_latency = None
+    store = extractor.get_store()
+    store.close()
+    return {
+        'posts': len(posts),
+        'concurrency': concurrency,
+        'posts_per_prompt': posts_per_prompt,
+        **counts,
+        'wall_s': round(wall, 3),
+        'posts_per_sec': round(counts['success'] / wall, 2) if wall else None,
+        'stages': {meter.name: _percentiles_ms(meter) for meter in meters},
+        # Timed inside InsightsStore.flush, so flushes that fire on extractor threads are included
+        'db_write_ms': round(store.stats['flush_ms'], 2),
+        'db_flushes': store.stats['flushes'],
+        'ollama': {key: client.stats[key] for key in ('requests', 'errors', 'failovers', 'parse_failures', 'batch_retries')},
+        'endpoints': [{'requests': e.requests, 'errors': e.errors, 'ejections': e.ejections} for e in client.endpoints],
+        'throttle': {'final_limit': throttle.limit, **throttle.stats},
+    }
+
+
+def _run_key(run):
+    return run['posts'], run['concurrency'], run['posts_per_prompt']
+
+
+def compare_to_baseline(runs, path):
+    """Annotate runs with the posts/sec of the matching run in an earlier result file"""
+    with open(path) as f:
+        baseline = {_run_key(run): run for run in json.load(f).get('runs', [])}
+    for run in runs:
+        old = baseline.get(_run_key(run))
+        if old and old.get('posts_per_sec'):
+            run['baseline_posts_per_sec'] = old['posts_per_sec']
+            run['change_pct'] = round((run['posts_per_sec'] / old['posts_per_sec'] - 1) * 100, 1)
+
+
+def bench_pipeline(args):
+    """Every (batch size, concurrency, posts per prompt) combination against the stub servers"""
+    xrpc = StubServer(StubXrpcHandler, latency_ms=args.xrpc_ms, error_rate=args.xrpc_error_rate,
+                      distribution=args.distribution)
+    # One stub per model server, each with its own slots, to measure scaling across endpoints
+    ollamas = [
+        StubServer(StubOllamaHandler, latency_ms=args.ollama_ms, per_post_ms=args.ollama_per_post_ms,
+                   error_rate=args.ollama_error_rate, garbage_rate=args.ollama_garbage_rate,
+                   distribution=args.distribution, slots=threading.BoundedSemaphore(args.ollama_parallel))
+        for _ in range(args.ollama_endpoints)
+    ]
+    extractor.BSKY_API_URL = f'{xrpc.url}/xrpc'
+    extractor.OLLAMA_URL = ollamas[0].url
+    extractor.OLLAMA_URLS = [ollama.url for ollama in ollamas[1:]]
+
+    workdir = tempfile.mkdtemp(prefix='cannect-bench-')
+    runs = []
+    try:
+        for batch_size in args.batch_sizes:
+            posts = synthetic_posts(batch_size, args.remote_fraction)
+            for concurrency in args.concurrency:
+                for posts_per_prompt in args.posts_per_prompt:
+                    db_path = os.path.join(workdir, f'insights-{len(runs)}.db')
+                    runs.append(run_pipeline_once(posts, concurrency, posts_per_prompt, db_path, args.adaptive))
+    finally:
+        xrpc.close()
+        for ollama in ollamas:
+            ollama.close()
+        shutil.rmtree(workdir)
+
+    result = {
+        'benchmark': 'pipeline',
+        'config': {key: value for key, value in vars(args).items() if key not in ('command', 'baseline')},
+        'runs': runs,
+    }
+    if args.baseline:
+        compare_to_baseline(runs, args.baseline)
+        result['baseline'] = args.baseline
+    return result
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cannect Intelligence benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_stats = sub.add_parser('stats', help='Stats queries before/after the normalized-column migration')
+    p_stats.add_argument('--rows', type=int, default=1000000, help='Synthetic insights rows')
+    p_stats.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    p_stats.add_argument('--keep', help='Write the synthetic DB here instead of a temp dir')
+
+    p_pipe = sub.add_parser('pipeline', help='batch.py pipeline throughput against stub XRPC/Ollama servers')
+    p_pipe.add_argument('--batch-sizes', type=int_list, default=[100, 500], help='Comma-separated posts per run')
+    p_pipe.add_argument('--concurrency', type=int_list, default=[1, 2, 4], help='Comma-separated in-flight extractions')
+    p_pipe.add_argument('--posts-per-prompt', type=int_list, default=[1], help='Comma-separated posts per prompt')
+    p_pipe.add_argument('--remote-fraction', type=float, default=0.2, help='Share of posts with no local text')
+    p_pipe.add_argument('--distribution', choices=['fixed', 'uniform', 'exponential', 'lognormal'],
+                        default='lognormal', help='Stub latency distribution')
+    p_pipe.add_argument('--xrpc-ms', type=float, default=80, help='Mean getPosts latency')
+    p_pipe.add_argument('--xrpc-error-rate', type=float, default=0.0, help='Share of getPosts calls that 500')
+    p_pipe.add_argument('--ollama-ms', type=float, default=50, help='Mean /api/generate latency for one post')
+    p_pipe.add_argument('--ollama-per-post-ms', type=float, default=20, help='Added latency per extra post in a prompt')
+    p_pipe.add_argument('--ollama-parallel', type=int, default=4, help='Requests each stub model serves at once')
+    p_pipe.add_argument('--ollama-endpoints', type=int, default=1, help='Stub model servers to balance across')
+    p_pipe.add_argument('--ollama-error-rate', type=float, default=0.0, help='Share of generate calls that 500')
+    p_pipe.add_argument('--ollama-garbage-rate', type=float, default=0.0, help='Share of responses that are not JSON')
+    p_pipe.add_argument('--adaptive', action='store_true',
+                        help='Use the AIMD throttle instead of holding each concurrency level fixed')
+    p_pipe.add_argument('--baseline', help='Earlier pipeline result JSON to compare posts/sec against')
+
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        result = bench_stats(args.rows, args.repeat, args.keep)
+    else:
+        result = bench_pipeline(args)
+    print(json.dumps(result, indent=2))
@@ -6,32 +6,91 @@ Processes all posts until complete, with automatic batching and progress trackin
 
 import subprocess
 import time
+import json
 import sqlite3
-from datetime import datetime
+import signal
+import argparse
+import threading
+from datetime import datetime, timedelta
 import sys
+from extractor import init_db
 
 INSIGHTS_DB = '/root/cannect-intel/insights.db'
 POSTS_DB = '/root/cannect-intel/posts.db'
 BATCH_SIZE = 500
 DELAY_BETWEEN_BATCHES = 60  # 1 minute cooldown between batches
+RATE_SESSIONS = 10  # Recent extraction_log sessions used for the ETA
+POSTS_RESYNC_SECONDS = 3600  # Recount posts this often; purges and deletes never reach the ledger
 
-def get_counts():
-    """Get processed and total counts"""
-    # Get processed count
+def get_progress(resync=False):
+    """Progress, remaining work and ETA from the progress ledger, without full-table scans.
+    posts_total only counts posts added since the last recount, so between recounts it is an upper
+    bound (posts.db rows are deleted by the retention purge and cleanup scripts). It is recounted
+    every POSTS_RESYNC_SECONDS, or now with resync"""
     conn = sqlite3.connect(INSIGHTS_DB)
+    conn.execute('ATTACH DATABASE ? AS feed', (POSTS_DB,))
     c = conn.cursor()
-    c.execute('SELECT COUNT(*) FROM insights')
-    processed = c.fetchone()[0]
-    conn.close()
     
-    # Get total posts
-    conn = sqlite3.connect(POSTS_DB)
-    c = conn.cursor()
-    c.execute('SELECT COUNT(*) FROM posts')
-    total = c.fetchone()[0]
+    ledger = dict(c.execute('SELECT key, value FROM progress').fetchall())
+    processed = ledger.get('insights', 0)
+    total = ledger.get('posts_total', 0)
+    hwm = ledger.get('posts_hwm')
+    synced_at = ledger.get('posts_synced_at', 0)
+    
+    if resync or time.time() - synced_at > POSTS_RESYNC_SECONDS:
+        # Full recount, dropping whatever was deleted since the last one
+        c.execute('SELECT COUNT(*), MAX(indexed_at) FROM feed.posts')
+        total, hwm = c.fetchone()
+        synced_at = time.time()
+        c.execute("INSERT OR REPLACE INTO progress (key, value) VALUES ('posts_total', ?), ('posts_hwm', ?), "
+                  "('posts_synced_at', ?)", (total, hwm, synced_at))
+        conn.commit()
+    else:
+        # Only posts indexed after the high-water mark are counted (an idx_indexed_at range scan)
+        c.execute('SELECT COUNT(*), MAX(indexed_at) FROM feed.posts WHERE indexed_at > ?', (hwm or '',))
+        new_posts, newest = c.fetchone()
+        if new_posts:
+            total += new_posts
+            hwm = newest
+            c.execute("INSERT OR REPLACE INTO progress (key, value) VALUES ('posts_total', ?), ('posts_hwm', ?)",
+                      (total, hwm))
+            conn.commit()
+    
+    # Recent throughput from the per-session extraction log
+    c.execute('''
+        SELECT SUM(posts_processed), SUM(julianday(ended_at) - julianday(started_at)) * 86400
+        FROM (SELECT * FROM extraction_log ORDER BY id DESC LIMIT ?)
+    ''', (RATE_SESSIONS,))
+    recent_posts, recent_seconds = c.fetchone()
+    
+    # Dead-lettered posts will never get an insight, so they are not remaining work
+    dead_lettered = c.execute('SELECT COUNT(*) FROM failed_extractions WHERE terminal').fetchone()[0]
     conn.close()
     
-    return processed, total
+    remaining = max(0, total - processed - dead_lettered)
+    rate = recent_posts / recent_seconds if recent_posts and recent_seconds else 0
+    eta_seconds = int(remaining / rate) if rate else None
+    
+    return {
+        'processed': processed,
+        'total': total,
+        'remaining': remaining,
+        'dead_lettered': dead_lettered,
+        'percent': round(100 * processed / total, 2) if total else 0,
+        'posts_per_minute': round(rate * 60, 1),
+        'eta_seconds': eta_seconds,
+        'eta': (datetime.now() + timedelta(seconds=eta_seconds)).isoformat() if eta_seconds is not None else None,
+        'posts_high_water_mark': hwm,
+        'posts_counted_at': datetime.fromtimestamp(synced_at).isoformat() if synced_at else None,
+        'checked_at': datetime.now().isoformat(),
+    }
+
+
+def get_counts():
+    """Get processed and total counts"""
+    progress = get_progress()
+    return progress['processed'], progress['total']
+
 
 def run_batch():
     """Run a single batch"""
@@ -43,6 +102,8 @@ def run_batch():
     return result.returncode == 0
 
 def main():
+    init_db()
+    
     print("=" * 60)
     print("CANNECT INTELLIGENCE - CONTINUOUS PROCESSOR")
     print("=" * 60)
@@ -95,5 +156,82 @@ def main():
         cwd='/root/cannect-intel'
     )
 
+def run_daemon(batch_size=BATCH_SIZE, pipeline=False, concurrency=None, posts_per_prompt=None, backfill=False):
+    """Process posts in-process, keeping the DB connection and the model warm between batches.
+    With backfill, walk posts.db oldest-first from the persisted backfill cursor"""
+    # Imported once for the life of the daemon rather than once per batch subprocess
+    import batch
+    from extractor import get_store, get_ollama
+    
+    stop = threading.Event()
+    
+    def request_stop(signum, frame):
+        print(f"\nReceived signal {signum}, finishing in-flight work...")
+        stop.set()
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    
+    print("=" * 60)
+    print("CANNECT INTELLIGENCE - CONTINUOUS DAEMON")
+    print("=" * 60)
+    print(f"Started at: {datetime.now()}")
+    print(f"Batch size: {batch_size} ({'pipeline' if pipeline else 'serial'}{', backfill' if backfill else ''})")
+    print()
+    
+    init_db()
+    get_ollama().warm_up()
+    
+    options = {'posts_per_prompt': posts_per_prompt or batch.POSTS_PER_PROMPT, 'stop': stop}
+    if pipeline:
+        options['concurrency'] = concurrency or batch.PIPELINE_CONCURRENCY
+    
+    batch_num = 0
+    while not stop.is_set():
+        if backfill:
+            posts, options['cursor'] = batch.fetch_backfill_posts(limit=batch_size)
+        else:
+            posts = batch.fetch_posts_from_db(limit=batch_size)
+        
+        if not posts:
+            # Only idle when there is nothing to do; stop.wait returns early on SIGTERM
+            print(f"No pending posts, checking again in {DELAY_BETWEEN_BATCHES}s...")
+            stop.wait(DELAY_BETWEEN_BATCHES)
+            continue
+        
+        batch_num += 1
+        print(f"\n{'='*60}")
+        print(f"BATCH #{batch_num} | {datetime.now()}")
+        print(f"{'='*60}")
+        
+        try:
+            if pipeline:
+                batch.process_posts_pipeline(posts, max_posts=batch_size, **options)
+            else:
+                batch.process_posts(posts, max_posts=batch_size, **options)
+        except Exception as e:
+            print(f"\n⚠️ Batch failed: {e}, waiting {DELAY_BETWEEN_BATCHES}s before retry...")
+            stop.wait(DELAY_BETWEEN_BATCHES)
+    
+    get_store().close()
+    print(f"\nDaemon stopped cleanly after {batch_num} batches at {datetime.now()}")
+
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Cannect Intelligence continuous runner')
+    parser.add_argument('--status', action='store_true', help='Recount posts, then print progress, remaining work and ETA as JSON')
+    parser.add_argument('--daemon', action='store_true', help='Process in-process instead of one subprocess per batch')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Posts per batch')
+    parser.add_argument('--pipeline', action='store_true', help='Use the concurrent pipeline (daemon mode)')
+    parser.add_argument('--concurrency', type=int, help='Max in-flight Ollama requests (daemon pipeline mode)')
+    parser.add_argument('--posts-per-prompt', type=int, help='Posts packed into one Ollama prompt (daemon mode)')
+    parser.add_argument('--backfill', action='store_true', help='Walk posts oldest-first from the saved cursor (daemon mode, one worker at a time)')
+    args = parser.parse_args()
+    
+    if args.status:
+        init_db(verbose=False)
+        print(json.dumps(get_progress(resync=True), indent=2))
+    elif args.daemon:
+        run_daemon(args.batch_size, args.pipeline, args.concurrency, args.posts_per_prompt, args.backfill)
+    else:
+        main()
@@ -6,17 +6,53 @@ Extracts structured insights from Cannect posts using Qwen2.5 via Ollama
 
 import sqlite3
 import json
+import re
+import hashlib
 import requests
 import time
 import os
+import atexit
+import socket
+import threading
 from datetime import datetime
+from stats import normalize_lower
+from keywords import normalize_keywords
 
 # Configuration
-OLLAMA_URL = 'http://localhost:11434/api/generate'
+OLLAMA_URL = 'http://localhost:11434'
+OLLAMA_URLS = []  # Extra model servers to balance across alongside OLLAMA_URL
+OLLAMA_KEEP_ALIVE = '30m'  # Keep the model resident across cooldowns and idle gaps
+OLLAMA_POOL_SIZE = 8  # Pooled HTTP connections to Ollama
+RELOAD_THRESHOLD_MS = 1000  # load_duration above this means the model was (re)loaded
+LATENCY_EWMA = 0.3  # Smoothing for per-endpoint latency
+EJECT_AFTER_ERRORS = 3  # Consecutive failures before an endpoint is taken out of rotation
+EJECT_LATENCY_FACTOR = 3.0  # Endpoint latency this many times the fastest endpoint's counts as slow
+EJECT_SECONDS = 30  # First ejection period; doubles for each repeat ejection, up to EJECT_MAX_SECONDS
+EJECT_MAX_SECONDS = 600
+HEALTH_CHECK_TIMEOUT = 5  # Seconds for the GET /api/tags probe before an endpoint is readmitted
+STRUCTURED_OUTPUT = False  # Constrain Ollama output with the INSIGHT_SCHEMA grammar
+NUM_PREDICT = 300  # Max tokens per post in free-form mode
+STRUCTURED_NUM_PREDICT = 120  # Schema output is compact, so far fewer tokens are needed
 MODEL = 'qwen2.5:7b'
 INSIGHTS_DB = '/root/cannect-intel/insights.db'
+BSKY_API_URL = 'https://public.api.bsky.app/xrpc'
+GET_POSTS_MAX_URIS = 25  # app.bsky.feed.getPosts accepts at most 25 URIs per call
 BATCH_SIZE = 50  # Posts per batch
-MAX_CPU_PERCENT = 70  # Pause if system CPU goes above this
+FLUSH_EVERY_ROWS = 50  # Buffered insights written per transaction
+FLUSH_EVERY_SECONDS = 10  # Max time an insight sits in the write buffer
+EXTRACTION_CACHE = True  # Reuse insights for posts whose normalized text was already extracted
+PROMPT_VERSION = 1  # Bump whenever the extraction prompts change, to invalidate cached results
+NEAR_EMPTY_LETTERS = 3  # Normalized texts with fewer letters than this skip the LLM entirely
+CACHE_MEMORY_ENTRIES = 20000  # In-process cache size before it is reset
+MAX_EXTRACTION_ATTEMPTS = 5  # Failed extractions are dead-lettered after this many attempts
+RETRY_BASE_SECONDS = 300  # Backoff after the first failure; doubles per attempt up to RETRY_MAX_SECONDS
+RETRY_MAX_SECONDS = 86400
+TERMINAL_REASONS = {'no_text', 'too_short'}  # Failures that no retry can fix
+# Outages and worker errors, not the post: retried with backoff but never dead-lettered
+INFRA_REASONS = {'fetch_error', 'ollama_error', 'extract_error', 'save_error'}
+CLAIM_TTL_SECONDS = 900  # Lease on claimed posts; a crashed worker's posts free up after this
+BACKFILL_CHUNK_ROWS = 5000  # Rows per transaction when backfilling new columns
+BACKFILL_PAUSE = 0.05  # Seconds between backfill chunks so the writer can get in
 
 # Extraction prompt - using $TEXT$ as placeholder to avoid JSON brace conflicts
 EXTRACTION_PROMPT = '''Extract structured information from this cannabis community social media post.
@@ -35,11 +71,159 @@ $TEXT$
 
 JSON OUTPUT:'''
 
+# Batched prompt - several posts per call so the preamble is only evaluated once
+BATCH_EXTRACTION_PROMPT = '''Extract structured information from each of these cannabis community social media posts.
+Each post starts with its index in square brackets.
+Return ONLY a valid JSON array with one object per post, with these fields (use null if not found):
 
-def init_db():
+{
+  "index": "the post's index number",
+  "product": "strain name, product type, or brand mentioned (e.g., 'Blue Dream', 'gummies', 'Cookies')",
+  "location": "any location hints - dispensary, city, state, or region",
+  "mood": "overall sentiment or emotion (positive/negative/neutral/excited/relaxed/etc)",
+  "type": "post type: review, question, recommendation, story, photo, announcement, other",
+  "keywords": ["list", "of", "relevant", "keywords"]
+}
+
+POSTS:
+$POSTS$
+
+JSON OUTPUT:'''
+
+
+# JSON schema for Ollama's `format` option (grammar-constrained decoding)
+INSIGHT_FIELDS = {
+    'product': {'type': ['string', 'null']},
+    'location': {'type': ['string', 'null']},
+    'mood': {'type': ['string', 'null']},
+    'type': {'type': ['string', 'null']},
+    'keywords': {'type': 'array', 'items': {'type': 'string'}},
+}
+INSIGHT_SCHEMA = {
+    'type': 'object',
+    'properties': INSIGHT_FIELDS,
+    'required': list(INSIGHT_FIELDS),
+}
+BATCH_INSIGHT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'posts': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'index': {'type': 'integer'}, **INSIGHT_FIELDS},
+                'required': ['index', *INSIGHT_FIELDS],
+            },
+        },
+    },
+    'required': ['posts'],
+}
+
+
+# Returned without an LLM call for link-only / emoji-only posts
+EMPTY_INSIGHTS = {'product': None, 'location': None, 'mood': None, 'type': 'other', 'keywords': []}
+
+
+def _add_missing_columns(c, table, columns):
+    """ALTER TABLE ADD COLUMN for any of {name: type} not already on the table. Returns the names added.
+    Safe when several workers start on an old database at once"""
+    added = []
+    # Check and alter under the write lock, so two workers can't both see the column missing
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        existing = {row[1] for row in c.execute(f'PRAGMA table_info({table})')}
+        for name, col_type in columns.items():
+            if name in existing:
+                continue
+            try:
+                c.execute(f'ALTER TABLE {table} ADD COLUMN {name} {col_type}')
+                added.append(name)
+            except sqlite3.OperationalError as e:
+                # Added by a process that doesn't take the lock (an older build)
+                if 'duplicate column name' not in str(e):
+                    raise
+        c.execute('COMMIT')
+    except Exception:
+        c.execute('ROLLBACK')
+        raise
+    return added
+
+
+def _init_progress_ledger(c):
+    """Counters kept current by triggers, so progress never needs COUNT(*) over insights"""
+    c.execute('CREATE TABLE IF NOT EXISTS progress (key TEXT PRIMARY KEY, value)')
+    if c.execute("SELECT 1 FROM progress WHERE key = 'insights'").fetchone():
+        return
+    
+    # One-time seed; triggers and seed go in together so no concurrent insert is missed or double-counted.
+    # A worker that lost the race to seed finds the row already there and leaves it alone
+    c.execute('BEGIN IMMEDIATE')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_insights_insert AFTER INSERT ON insights
+        BEGIN UPDATE progress SET value = value + 1 WHERE key = 'insights'; END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_insights_delete AFTER DELETE ON insights
+        BEGIN UPDATE progress SET value = value - 1 WHERE key = 'insights'; END
+    ''')
+    c.execute("INSERT OR IGNORE INTO progress (key, value) SELECT 'insights', COUNT(*) FROM insights")
+    c.execute('COMMIT')
+
+
+def _chunked_backfill(conn, name, select_sql, apply_chunk, verbose=True):
+    """Run apply_chunk over insights by rowid in short transactions, resuming from the ledger cursor"""
+    c = conn.cursor()
+    state = dict(c.execute('SELECT key, value FROM progress WHERE key LIKE ?', (f'{name}_backfill_%',)).fetchall())
+    if state.get(f'{name}_backfill_done'):
+        return
+    
+    cursor = state.get(f'{name}_backfill_rowid', 0)
+    updated = 0
+    while True:
+        # Read and write under the same lock so a concurrent upsert can't be overwritten
+        c.execute('BEGIN IMMEDIATE')
+        rows = c.execute(f'{select_sql} WHERE rowid > ? ORDER BY rowid LIMIT ?', (cursor, BACKFILL_CHUNK_ROWS)).fetchall()
+        if not rows:
+            c.execute('INSERT OR REPLACE INTO progress (key, value) VALUES (?, 1)', (f'{name}_backfill_done',))
+            c.execute('COMMIT')
+            break
+        
+        apply_chunk(c, rows)
+        cursor = rows[-1][0]
+        c.execute('INSERT OR REPLACE INTO progress (key, value) VALUES (?, ?)', (f'{name}_backfill_rowid', cursor))
+        c.execute('COMMIT')
+        
+        updated += len(rows)
+        if verbose and updated % (BACKFILL_CHUNK_ROWS * 20) == 0:
+            print(f'  {name} backfill: {updated} rows...')
+        time.sleep(BACKFILL_PAUSE)
+    
+    if verbose and updated:
+        print(f'[OK] {name} backfill: {updated} rows')
+
+
+def _backfill_normalized_columns(c, rows):
+    c.executemany(
+        'UPDATE insights SET product_norm = ?, location_norm = ? WHERE rowid = ?',
+        [(normalize_lower(product), normalize_lower(location), rowid) for rowid, product, location in rows]
+    )
+
+
+def _backfill_keywords(c, rows):
+    c.executemany(
+        'INSERT OR IGNORE INTO insight_keywords (keyword, uri, extracted_at) VALUES (?, ?, ?)',
+        [(keyword, uri, extracted_at)
+         for _, uri, blob, extracted_at in rows
+         for keyword in normalize_keywords(blob)]
+    )
+
+
+def init_db(verbose=True):
     """Initialize the insights database"""
     conn = sqlite3.connect(INSIGHTS_DB)
     c = conn.cursor()
+    # WAL is persistent on the file: readers (stats, dashboards) no longer block the writer
+    c.execute('PRAGMA journal_mode=WAL')
     c.execute('''
         CREATE TABLE IF NOT EXISTS insights (
             uri TEXT PRIMARY KEY,
@@ -62,16 +246,92 @@ def init_db():
             errors INTEGER
         )
     ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            key TEXT PRIMARY KEY,
+            insights TEXT,
+            created_at TEXT
+        )
+    ''')
+    _add_missing_columns(c, 'extraction_log', {
+        'model_version': 'TEXT',
+        'structured': 'INTEGER',
+        'requests': 'INTEGER',
+        'parse_failures': 'INTEGER',
+        'wasted_tokens': 'INTEGER',
+    })
+    _add_missing_columns(c, 'insights', {
+        'product_norm': 'TEXT',
+        'location_norm': 'TEXT',
+    })
+    # Inverted index over the keywords blob; extracted_at is copied in so time windows stay index-only
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS insight_keywords (
+            keyword TEXT NOT NULL,
+            uri TEXT NOT NULL,
+            extracted_at TEXT,
+            PRIMARY KEY (keyword, uri)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_insight_keywords_uri ON insight_keywords(uri, keyword)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_insight_keywords_time ON insight_keywords(extracted_at, keyword)')
+    # Leases that let several batch.py workers split the backlog without extracting a post twice
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS claims (
+            uri TEXT PRIMARY KEY,
+            worker TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_claims_worker ON claims(worker)')
+    # Retry queue: posts that failed are skipped until next_attempt_at, or for good once terminal
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS failed_extractions (
+            uri TEXT PRIMARY KEY,
+            reason TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            content_failures INTEGER NOT NULL DEFAULT 0,
+            first_failed_at TEXT,
+            last_failed_at TEXT,
+            next_attempt_at REAL NOT NULL,
+            terminal INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    if _add_missing_columns(c, 'failed_extractions', {'content_failures': 'INTEGER NOT NULL DEFAULT 0'}):
+        # Older rows counted outages towards the cap; give those posts their retries back
+        c.execute(f'''
+            UPDATE failed_extractions SET terminal = 0, next_attempt_at = 0
+            WHERE terminal AND reason IN ({', '.join('?' * len(INFRA_REASONS))})
+        ''', sorted(INFRA_REASONS))
+    c.execute('CREATE INDEX IF NOT EXISTS idx_failed_extractions_terminal ON failed_extractions(reason) WHERE terminal')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS insight_keywords_delete AFTER DELETE ON insights
+        BEGIN DELETE FROM insight_keywords WHERE uri = old.uri; END
+    ''')
+    conn.commit()
+    
+    _init_progress_ledger(c)
+    _chunked_backfill(conn, 'norm', 'SELECT rowid, product, location FROM insights',
+                      _backfill_normalized_columns, verbose)
+    _chunked_backfill(conn, 'keywords', 'SELECT rowid, uri, keywords, extracted_at FROM insights',
+                      _backfill_keywords, verbose)
+    
+    # Covering indexes for the stats GROUP BYs, built once the backfill has filled the columns
+    c.execute('CREATE INDEX IF NOT EXISTS idx_insights_mood ON insights(mood)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_insights_post_type ON insights(post_type)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_insights_product_norm ON insights(product_norm) WHERE product_norm IS NOT NULL')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_insights_location_norm ON insights(location_norm) WHERE location_norm IS NOT NULL')
     conn.commit()
     conn.close()
-    print(f'[OK] Initialized database at {INSIGHTS_DB}')
+    if verbose:
+        print(f'[OK] Initialized database at {INSIGHTS_DB}')
 
 
 def fetch_post_text(uri):
     """Fetch post text via AT Protocol public API"""
     try:
         # Use public Bluesky API to get post
-        url = 'https://public.api.bsky.app/xrpc/app.bsky.feed.getPostThread'
+        url = f'{BSKY_API_URL}/app.bsky.feed.getPostThread'
         params = {'uri': uri, 'depth': 0}
         
         resp = requests.get(url, params=params, timeout=10)
@@ -85,82 +345,803 @@ def fetch_post_text(uri):
         return None
 
 
-def extract_insights(text):
-    """Send text to Ollama for extraction"""
-    prompt = EXTRACTION_PROMPT.replace('$TEXT$', text)
+def fetch_posts_text(uris):
+    """Fetch text for many posts via getPosts, 25 URIs per request.
+    Returns ({uri: text}, {uris whose request failed}); posts absent from a 200 response are in neither"""
+    texts = {}
+    failed = set()
+    url = f'{BSKY_API_URL}/app.bsky.feed.getPosts'
     
-    try:
-        resp = requests.post(OLLAMA_URL, json={
-            'model': MODEL,
+    for i in range(0, len(uris), GET_POSTS_MAX_URIS):
+        chunk = uris[i:i + GET_POSTS_MAX_URIS]
+        try:
+            # requests encodes the list as repeated ?uris=...&uris=... params
+            resp = requests.get(url, params={'uris': chunk}, timeout=10)
+            if resp.status_code != 200:
+                print(f'  getPosts returned {resp.status_code} for {len(chunk)} posts')
+                failed.update(chunk)
+                continue
+            # Deleted or blocked posts are simply absent from the response
+            for post in resp.json().get('posts', []):
+                texts[post['uri']] = post.get('record', {}).get('text', '')
+        except Exception as e:
+            print(f'  Error fetching {len(chunk)} posts: {e}')
+            failed.update(chunk)
+    
+    return texts, failed
+
+
+def resolve_post_texts(posts):
+    """Fill in missing text for (uri, text) pairs, hitting the network only for the gaps.
+    Returns (posts, {uris whose fetch failed}); those come back with text None but may still exist"""
+    missing = [uri for uri, text in posts if not text]
+    fetched, failed = fetch_posts_text(missing) if missing else ({}, set())
+    return [(uri, text or fetched.get(uri)) for uri, text in posts], failed
+
+
+class OllamaEndpoint:
+    """One Ollama server: pooled session, in-flight count, latency EWMA and ejection state"""
+    
+    def __init__(self, base_url, pool_size=OLLAMA_POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.in_flight = 0
+        self.latency = None
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.requests = 0
+        self.errors = 0
+    
+    @property
+    def healthy(self):
+        return time.time() >= self.ejected_until
+    
+    def score(self):
+        """Expected wait if one more request is sent here; unmeasured endpoints go first"""
+        return (self.in_flight + 1) * (self.latency or 0.0)
+    
+    def eject(self, reason):
+        # Repeat offenders stay out longer
+        seconds = min(EJECT_MAX_SECONDS, EJECT_SECONDS * 2 ** self.ejections)
+        self.ejected_until = time.time() + seconds
+        self.ejections += 1
+        self.consecutive_errors = 0
+        print(f'  Ollama endpoint {self.base_url} ejected for {seconds}s ({reason})')
+    
+    def check_health(self, model):
+        """GET /api/tags and confirm the model is installed"""
+        try:
+            resp = self.session.get(f'{self.base_url}/api/tags', timeout=HEALTH_CHECK_TIMEOUT)
+            names = [m.get('name', '') for m in resp.json().get('models', [])]
+            return resp.status_code == 200 and (not names or any(n.split(':')[0] == model.split(':')[0] for n in names))
+        except Exception:
+            return False
+    
+    def summary(self):
+        latency = f'{self.latency * 1000:.0f}ms' if self.latency is not None else '-'
+        state = 'up' if self.healthy else f'ejected {self.ejected_until - time.time():.0f}s'
+        return f'{self.base_url} {state}, {self.requests} req, {self.errors} err, {latency}'
+
+
+class OllamaClient:
+    """Keep-alive sessions to one or more Ollama servers, least-loaded routing and per-request timing stats"""
+    
+    def __init__(self, base_url=None, model=None, keep_alive=OLLAMA_KEEP_ALIVE, pool_size=OLLAMA_POOL_SIZE,
+                 structured=None):
+        # base_url may be a single URL or a list of them; by default OLLAMA_URL plus OLLAMA_URLS
+        urls = base_url or [OLLAMA_URL] + OLLAMA_URLS
+        if isinstance(urls, str):
+            urls = [urls]
+        # A server listed twice would get twice the traffic and be ejected twice
+        urls = list(dict.fromkeys(url.rstrip('/') for url in urls))
+        self.endpoints = [OllamaEndpoint(url, pool_size) for url in urls]
+        self.model = model or MODEL
+        self.keep_alive = keep_alive
+        self.structured = STRUCTURED_OUTPUT if structured is None else structured
+        self.on_latency = None  # Optional callback(seconds) per request, e.g. AdaptiveThrottle.record
+        self.lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'failovers': 0,
+            'reloads': 0,
+            'load_ms': 0.0,
+            'prompt_eval_ms': 0.0,
+            'eval_ms': 0.0,
+            'prompt_tokens': 0,
+            'eval_tokens': 0,
+            'batch_retries': 0,
+            'parse_failures': 0,
+            'wasted_tokens': 0,
+        }
+    
+    def _acquire(self, exclude=()):
+        """Pick the healthy endpoint with the lowest expected wait and count the request against it"""
+        self._readmit()
+        with self.lock:
+            candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+            if not candidates and not exclude:
+                # Everything is ejected: keep trying whichever comes back soonest rather than failing outright
+                candidates = [min(self.endpoints, key=lambda e: e.ejected_until)]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=lambda e: e.score())
+            endpoint.in_flight += 1
+            return endpoint
+    
+    def _release(self, endpoint, latency, ok):
+        with self.lock:
+            endpoint.in_flight -= 1
+            endpoint.requests += 1
+            if not ok:
+                endpoint.errors += 1
+                endpoint.consecutive_errors += 1
+                if endpoint.consecutive_errors >= EJECT_AFTER_ERRORS and len(self.endpoints) > 1:
+                    endpoint.eject(f'{endpoint.consecutive_errors} consecutive errors')
+                return
+            
+            endpoint.consecutive_errors = 0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency = LATENCY_EWMA * latency + (1 - LATENCY_EWMA) * endpoint.latency
+            
+            others = [e.latency for e in self.endpoints if e is not endpoint and e.healthy and e.latency]
+            if others and endpoint.latency > min(others) * EJECT_LATENCY_FACTOR:
+                endpoint.eject(f'{endpoint.latency * 1000:.0f}ms vs {min(others) * 1000:.0f}ms')
+    
+    def _readmit(self):
+        """Health-check ejected endpoints whose ejection has run out; failing ones are ejected again"""
+        for endpoint in self.endpoints:
+            if endpoint.ejected_until and endpoint.healthy:
+                with self.lock:
+                    # Claim the check so concurrent requests don't all probe the same endpoint
+                    if not endpoint.ejected_until or not endpoint.healthy:
+                        continue
+                    endpoint.ejected_until = time.time() + HEALTH_CHECK_TIMEOUT
+                if endpoint.check_health(self.model):
+                    with self.lock:
+                        endpoint.ejected_until = 0.0
+                        # Re-measure from scratch; its old latency may be why it was ejected
+                        endpoint.latency = None
+                    print(f'  Ollama endpoint {endpoint.base_url} readmitted')
+                else:
+                    with self.lock:
+                        endpoint.eject('health check failed')
+    
+    def generate(self, prompt, options=None, format=None, timeout=120):
+        """POST /api/generate to the least-loaded endpoint, failing over once; decoded body or None"""
+        payload = {
+            'model': self.model,
             'prompt': prompt,
             'stream': False,
-            'options': {
-                'temperature': 0.1,  # Low for consistent extraction
-                'num_predict': 300
-            }
-        }, timeout=120)
+            'keep_alive': self.keep_alive,
+        }
+        if options:
+            payload['options'] = options
+        if format:
+            payload['format'] = format
         
-        if resp.status_code == 200:
-            result = resp.json().get('response', '')
-            # Try to parse JSON from response
+        start = time.time()
+        data = None
+        tried = []
+        while len(tried) < min(2, len(self.endpoints)):
+            endpoint = self._acquire(exclude=tried)
+            if endpoint is None:
+                break
+            if tried:
+                self.count('failovers')
+            tried.append(endpoint)
+            
+            attempt_start = time.time()
             try:
-                # Find JSON in response
-                start = result.find('{')
-                end = result.rfind('}') + 1
-                if start >= 0 and end > start:
-                    return json.loads(result[start:end])
-            except json.JSONDecodeError:
-                pass
-        return None
-    except Exception as e:
-        print(f'  Ollama error: {e}')
+                resp = endpoint.session.post(f'{endpoint.base_url}/api/generate', json=payload, timeout=timeout)
+                if resp.status_code != 200:
+                    raise RuntimeError(f'HTTP {resp.status_code}')
+                data = resp.json()
+            except Exception as e:
+                with self.lock:
+                    self.stats['errors'] += 1
+                print(f'  Ollama error ({endpoint.base_url}): {e}')
+            self._release(endpoint, time.time() - attempt_start, data is not None)
+            if data is not None:
+                break
+        
+        if self.on_latency:
+            self.on_latency(time.time() - start)
+        if data is not None:
+            self._record(data)
+        return data
+    
+    def warm_up(self):
+        """Load the model on every endpoint ahead of the first real request. Returns load time in seconds"""
+        start = time.time()
+        # An empty prompt makes Ollama load the model and return immediately
+        for endpoint in self.endpoints:
+            endpoint_start = time.time()
+            try:
+                resp = endpoint.session.post(f'{endpoint.base_url}/api/generate',
+                                             json={'model': self.model, 'prompt': '', 'stream': False, 'keep_alive': self.keep_alive},
+                                             timeout=300)
+                data = resp.json() if resp.status_code == 200 else None
+            except Exception as e:
+                print(f'  Ollama error ({endpoint.base_url}): {e}')
+                data = None
+            if data is not None:
+                print(f'[OK] {self.model} warm on {endpoint.base_url} ({time.time() - endpoint_start:.1f}s, '
+                      f'load {data.get("load_duration", 0) / 1e6:.0f}ms)')
+            elif len(self.endpoints) > 1:
+                with self.lock:
+                    endpoint.eject('warm-up failed')
+        return time.time() - start
+    
+    def _record(self, data):
+        # Ollama reports durations in nanoseconds
+        load_ms = data.get('load_duration', 0) / 1e6
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['load_ms'] += load_ms
+            self.stats['prompt_eval_ms'] += data.get('prompt_eval_duration', 0) / 1e6
+            self.stats['eval_ms'] += data.get('eval_duration', 0) / 1e6
+            self.stats['prompt_tokens'] += data.get('prompt_eval_count', 0)
+            self.stats['eval_tokens'] += data.get('eval_count', 0)
+            if load_ms > RELOAD_THRESHOLD_MS:
+                self.stats['reloads'] += 1
+    
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+    
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+    
+    def since(self, snapshot):
+        """Stats accumulated after an earlier snapshot()"""
+        return {k: v - snapshot.get(k, 0) for k, v in self.snapshot().items()}
+    
+    def summary(self, since=None):
+        """One-line timing summary, optionally relative to an earlier snapshot()"""
+        stats = self.since(since) if since else self.snapshot()
+        n = stats['requests'] or 1
+        return (f"{stats['requests']} requests, {stats['errors']} errors, {stats['reloads']} model reloads "
+                f"({stats['load_ms'] / 1000:.1f}s loading) | avg prompt_eval {stats['prompt_eval_ms'] / n:.0f}ms "
+                f"({stats['prompt_tokens'] / n:.0f} tok), eval {stats['eval_ms'] / n:.0f}ms ({stats['eval_tokens'] / n:.0f} tok)"
+                + (f" | {stats['batch_retries']} batch retries" if stats['batch_retries'] else '')
+                + (f" | {stats['parse_failures']} parse failures ({stats['wasted_tokens']} tok wasted)"
+                   if stats['parse_failures'] else '')
+                + (f" | {stats['failovers']} failovers" if stats['failovers'] else '')
+                + (''.join(f"\n  {e.summary()}" for e in self.endpoints) if len(self.endpoints) > 1 else ''))
+
+
+_ollama = None
+
+
+def get_ollama():
+    """Process-wide OllamaClient"""
+    global _ollama
+    if _ollama is None:
+        _ollama = OllamaClient()
+    return _ollama
+
+
+def _parse_json(result, opener, closer):
+    """Parse a JSON response, falling back to the outermost opener..closer span"""
+    try:
+        return json.loads(result)
+    except json.JSONDecodeError:
+        pass
+    start = result.find(opener)
+    end = result.rfind(closer) + 1
+    if start >= 0 and end > start:
+        try:
+            return json.loads(result[start:end])
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def _generate(client, prompt, n_posts, schema):
+    """Run one extraction prompt in the client's free-form or structured mode"""
+    return client.generate(
+        prompt,
+        options={
+            'temperature': 0.1,  # Low for consistent extraction
+            'num_predict': (STRUCTURED_NUM_PREDICT if client.structured else NUM_PREDICT) * n_posts
+        },
+        format=schema if client.structured else None
+    )
+
+
+def _parse_failed(client, data):
+    client.count('parse_failures')
+    client.count('wasted_tokens', data.get('eval_count', 0))
+
+
+def _extract_one(text, client):
+    """Single-post extraction without the cache. Returns (insights, failure reason)"""
+    prompt = EXTRACTION_PROMPT.replace('$TEXT$', text)
+    
+    data = _generate(client, prompt, 1, INSIGHT_SCHEMA)
+    if data is None:
+        return None, 'ollama_error'
+    
+    insights = _parse_json(data.get('response', ''), '{', '}')
+    if not isinstance(insights, dict):
+        _parse_failed(client, data)
+        return None, 'parse_error'
+    return insights, None
+
+
+def _extract_many(texts, client):
+    """Multi-post extraction without the cache. Returns [(insights, failure reason)] aligned with texts"""
+    if len(texts) == 1:
+        return [_extract_one(texts[0], client)]
+    
+    # One line per post so the [index] markers stay unambiguous
+    posts = '\n'.join(f'[{i}] ' + ' '.join(text.split()) for i, text in enumerate(texts))
+    prompt = BATCH_EXTRACTION_PROMPT.replace('$POSTS$', posts)
+    
+    data = _generate(client, prompt, len(texts), BATCH_INSIGHT_SCHEMA)
+    if data is None:
+        # Ollama is down or timing out; per-post calls would only pile onto it. The retry queue backs off instead
+        return [(None, 'ollama_error')] * len(texts)
+    
+    results = [None] * len(texts)
+    items = _parse_json(data.get('response', ''), '[', ']')
+    # Structured mode wraps the array as {"posts": [...]}
+    if isinstance(items, dict):
+        items = items.get('posts')
+    if not isinstance(items, list):
+        _parse_failed(client, data)
+        items = []
+    
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.pop('index'))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(texts) and results[index] is None:
+            results[index] = (item, None)
+    
+    # Anything missing or malformed from a good response gets a single-post retry
+    for i, result in enumerate(results):
+        if result is None:
+            client.count('batch_retries')
+            results[i] = _extract_one(texts[i], client)
+    
+    return results
+
+
+def try_extract_insights_batch(texts, client=None, cache=None):
+    """Extract several posts with one prompt, serving repeats from the cache. Returns [(insights, reason)]"""
+    client = client or get_ollama()
+    cache = cache or get_cache()
+    results = [None] * len(texts)
+    
+    # Cache hits and near-empty texts never reach the model; duplicates in the group share one slot
+    misses = {}
+    for i, text in enumerate(texts):
+        key, insights = cache.lookup(text) if cache else (None, None)
+        if insights is not None:
+            results[i] = (insights, None)
+        else:
+            misses.setdefault(key if key else i, []).append(i)
+    
+    if misses:
+        groups = list(misses.items())
+        extracted = _extract_many([texts[indexes[0]] for _, indexes in groups], client)
+        for (key, indexes), (insights, reason) in zip(groups, extracted):
+            if insights is not None and cache:
+                cache.put(key, insights)
+            for i in indexes:
+                results[i] = (insights, reason)
+    
+    return results
+
+
+def try_extract_insights(text, client=None, cache=None):
+    """Send text to Ollama for extraction. Returns (insights, None) or (None, 'ollama_error' | 'parse_error')"""
+    return try_extract_insights_batch([text], client, cache)[0]
+
+
+def extract_insights(text, client=None, cache=None):
+    """Send text to Ollama for extraction"""
+    return try_extract_insights(text, client, cache)[0]
+
+
+def extract_insights_batch(texts, client=None, cache=None):
+    """Extract insights for several posts with one prompt. Returns results aligned with texts"""
+    return [insights for insights, _ in try_extract_insights_batch(texts, client, cache)]
+
+
+def normalize_text(text):
+    """Lower-case, link-free, whitespace-collapsed form of a post used for cache keys"""
+    text = re.sub(r'https?://\S+|www\.\S+', ' ', text.lower())
+    return ' '.join(text.split())
+
+
+class ExtractionCache:
+    """Insights keyed on hash(MODEL, PROMPT_VERSION, normalized text), persisted in insights.db"""
+    
+    def __init__(self, store):
+        self.store = store
+        self.memory = {}
+        self.lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'near_empty': 0}
+    
+    def key(self, normalized):
+        return hashlib.sha256(f'{MODEL}\0{PROMPT_VERSION}\0{normalized}'.encode()).hexdigest()
+    
+    def lookup(self, text):
+        """Return (key, cached insights or None). Near-empty texts resolve to EMPTY_INSIGHTS"""
+        normalized = normalize_text(text)
+        with self.lock:
+            self.stats['lookups'] += 1
+            if sum(ch.isalpha() for ch in normalized) < NEAR_EMPTY_LETTERS:
+                self.stats['near_empty'] += 1
+                return None, dict(EMPTY_INSIGHTS)
+        
+        key = self.key(normalized)
+        with self.lock:
+            insights = self.memory.get(key)
+        if insights is None:
+            insights = self.store.cache_get(key)
+            if insights is not None:
+                self._remember(key, insights)
+        
+        if insights is not None:
+            with self.lock:
+                self.stats['hits'] += 1
+            return key, dict(insights)
+        return key, None
+    
+    def put(self, key, insights):
+        self._remember(key, insights)
+        self.store.cache_put(key, insights)
+    
+    def _remember(self, key, insights):
+        with self.lock:
+            if len(self.memory) >= CACHE_MEMORY_ENTRIES:
+                self.memory.clear()
+            self.memory[key] = insights
+    
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+    
+    def summary(self, since=None):
+        stats = self.snapshot()
+        if since:
+            stats = {k: v - since.get(k, 0) for k, v in stats.items()}
+        served = stats['hits'] + stats['near_empty']
+        rate = 100 * served / stats['lookups'] if stats['lookups'] else 0
+        return (f"{stats['hits']} hits + {stats['near_empty']} near-empty of {stats['lookups']} lookups "
+                f"({rate:.1f}% served without the LLM)")
+
+
+_cache = None
+
+
+def get_cache():
+    """Process-wide ExtractionCache on top of get_store(), or None if EXTRACTION_CACHE is off"""
+    global _cache
+    if not EXTRACTION_CACHE:
         return None
+    if _cache is None:
+        _cache = ExtractionCache(get_store())
+    return _cache
 
 
-def save_insight(uri, text, insights):
-    """Save extracted insights to database"""
-    conn = sqlite3.connect(INSIGHTS_DB)
-    c = conn.cursor()
+def _scalar(value):
+    """Model output can put lists/objects where a string belongs; store those as JSON text"""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(value)
+
+
+class InsightsStore:
+    """Single WAL-mode connection to insights.db with buffered, batched writes"""
     
-    keywords = json.dumps(insights.get('keywords', [])) if insights.get('keywords') else None
+    # Upsert rather than INSERT OR REPLACE: a re-extraction is an UPDATE, so the
+    # progress ledger's AFTER INSERT trigger only counts genuinely new posts
+    INSERT_SQL = '''
+        INSERT INTO insights 
+        (uri, post_text, product, location, mood, post_type, keywords, extracted_at, model_version,
+         product_norm, location_norm)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(uri) DO UPDATE SET
+            post_text = excluded.post_text,
+            product = excluded.product,
+            location = excluded.location,
+            product_norm = excluded.product_norm,
+            location_norm = excluded.location_norm,
+            mood = excluded.mood,
+            post_type = excluded.post_type,
+            keywords = excluded.keywords,
+            extracted_at = excluded.extracted_at,
+            model_version = excluded.model_version
+    '''
+    KEYWORDS_DELETE_SQL = 'DELETE FROM insight_keywords WHERE uri = ?'
+    FAILURE_CLEAR_SQL = 'DELETE FROM failed_extractions WHERE uri = ?'
+    # Backoff doubles with each attempt; in DO UPDATE, bare column names still refer to the previous row.
+    # Only content failures (not outages) count towards the dead-letter cap
+    FAILURE_SQL = '''
+        INSERT INTO failed_extractions
+        (uri, reason, attempts, content_failures, first_failed_at, last_failed_at, next_attempt_at, terminal)
+        VALUES (:uri, :reason, 1, :content, :at, :at, :now + :base, :terminal)
+        ON CONFLICT(uri) DO UPDATE SET
+            reason = excluded.reason,
+            attempts = attempts + 1,
+            content_failures = content_failures + excluded.content_failures,
+            last_failed_at = excluded.last_failed_at,
+            next_attempt_at = :now + min(:max, :base * (1 << attempts)),
+            terminal = excluded.terminal OR content_failures + excluded.content_failures >= :max_attempts
+    '''
+    KEYWORDS_INSERT_SQL = 'INSERT OR IGNORE INTO insight_keywords (keyword, uri, extracted_at) VALUES (?, ?, ?)'
     
-    c.execute('''
-        INSERT OR REPLACE INTO insights 
-        (uri, post_text, product, location, mood, post_type, keywords, extracted_at, model_version)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        uri,
-        text,
-        insights.get('product'),
-        insights.get('location'),
-        insights.get('mood'),
-        insights.get('type'),
-        keywords,
-        datetime.now().isoformat(),
-        MODEL
-    ))
-    conn.commit()
-    conn.close()
+    def __init__(self, path=None, flush_rows=FLUSH_EVERY_ROWS, flush_seconds=FLUSH_EVERY_SECONDS):
+        self.path = path or INSIGHTS_DB
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        # Shared with pipeline worker threads; every use goes through self.lock
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.lock = threading.RLock()
+        # Buffered statements, in first-use order: {sql: [params, ...]}
+        self.pending = {}
+        self.pending_rows = 0
+        self.last_flush = time.time()
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.last_renewal = 0.0
+        # Every flush is counted here, including those triggered inside add() on worker threads
+        self.stats = {'flushes': 0, 'flush_ms': 0.0, 'flushed_rows': 0}
+    
+    def _queue(self, sql, params, rows=1):
+        """Queue a write without flushing. Call under self.lock"""
+        self.pending.setdefault(sql, []).append(params)
+        self.pending_rows += rows
+    
+    def _maybe_flush(self):
+        """Flush once N rows or T seconds have accumulated. Call under self.lock"""
+        if self.pending_rows < self.flush_rows and time.time() - self.last_flush < self.flush_seconds:
+            return
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            # Nothing is lost: the rows stay buffered and go out with the next flush
+            print(f'  Flush of {self.pending_rows} buffered rows failed, will retry: {e}')
+    
+    def _buffer(self, sql, params, rows=1):
+        """Queue a write, flushing once N rows or T seconds have accumulated"""
+        with self.lock:
+            self._queue(sql, params, rows)
+            self._maybe_flush()
+    
+    def add(self, uri, text, insights):
+        """Buffer an insight for the next flush"""
+        keywords = json.dumps(insights.get('keywords', [])) if insights.get('keywords') else None
+        extracted_at = datetime.now().isoformat()
+        product, location, mood, post_type = (
+            _scalar(insights.get(field)) for field in ('product', 'location', 'mood', 'type')
+        )
+        row = (
+            uri,
+            text,
+            product,
+            location,
+            mood,
+            post_type,
+            keywords,
+            extracted_at,
+            MODEL,
+            normalize_lower(product),
+            normalize_lower(location)
+        )
+        with self.lock:
+            # Keyword rows ride along with their insight and don't count toward the flush threshold
+            self._queue(self.INSERT_SQL, row)
+            # Statements flush in first-use order, so a re-extraction's old keywords go before the new ones land
+            self._queue(self.KEYWORDS_DELETE_SQL, (uri,), rows=0)
+            self._queue(self.FAILURE_CLEAR_SQL, (uri,), rows=0)
+            for keyword in normalize_keywords(keywords):
+                self._queue(self.KEYWORDS_INSERT_SQL, (keyword, uri, extracted_at), rows=0)
+            # Only once the whole post is queued, so a flush never commits half of it
+            self._maybe_flush()
+    
+    def cache_get(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT insights FROM extraction_cache WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def cache_put(self, key, insights):
+        self._buffer(
+            'INSERT OR REPLACE INTO extraction_cache (key, insights, created_at) VALUES (?, ?, ?)',
+            (key, json.dumps(insights), datetime.now().isoformat())
+        )
+    
+    def flush(self):
+        """Write all buffered rows in one transaction. If it fails, the rows stay buffered"""
+        with self.lock:
+            # Counts as an attempt either way, so a failing database is retried at the normal cadence
+            self.last_flush = time.time()
+            if not self.pending:
+                return 0
+            start = time.perf_counter()
+            try:
+                with self.conn:
+                    for sql, params in self.pending.items():
+                        self.conn.executemany(sql, params)
+            finally:
+                self.stats['flushes'] += 1
+                self.stats['flush_ms'] += (time.perf_counter() - start) * 1000
+            # Cleared only after the commit; the lock keeps anything new from arriving in between
+            rows = self.pending_rows
+            self.stats['flushed_rows'] += rows
+            self.pending = {}
+            self.pending_rows = 0
+            return rows
+    
+    def log_session(self, started_at, ended_at, posts_processed, errors, client_stats, structured):
+        """Record one extraction session, including its parse-failure accounting"""
+        with self.lock:
+            self.flush()
+            with self.conn:
+                self.conn.execute('''
+                    INSERT INTO extraction_log
+                    (started_at, ended_at, posts_processed, errors, model_version, structured,
+                     requests, parse_failures, wasted_tokens)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    started_at.isoformat(),
+                    ended_at.isoformat(),
+                    posts_processed,
+                    errors,
+                    MODEL,
+                    int(structured),
+                    client_stats['requests'],
+                    client_stats['parse_failures'],
+                    client_stats['wasted_tokens']
+                ))
+    
+    def add_failure(self, uri, reason):
+        """Buffer a failed attempt: schedules the retry with backoff, or dead-letters the post"""
+        now = time.time()
+        self._buffer(self.FAILURE_SQL, {
+            'uri': uri,
+            'reason': reason,
+            'at': datetime.now().isoformat(),
+            'now': now,
+            'base': RETRY_BASE_SECONDS,
+            'max': RETRY_MAX_SECONDS,
+            'content': int(reason not in INFRA_REASONS),
+            'terminal': int(reason in TERMINAL_REASONS),
+            'max_attempts': MAX_EXTRACTION_ATTEMPTS,
+        })
+    
+    def set_progress(self, key, value):
+        """Buffer a progress-ledger value so it commits in the same flush as the insights before it"""
+        self._buffer('INSERT OR REPLACE INTO progress (key, value) VALUES (?, ?)', (key, value), rows=0)
+    
+    def get_progress(self, key):
+        with self.lock:
+            self.flush()
+            row = self.conn.execute('SELECT value FROM progress WHERE key = ?', (key,)).fetchone()
+            return row[0] if row else None
+    
+    def claim(self, uris, ttl=CLAIM_TTL_SECONDS):
+        """Lease uris to this worker. Returns the subset it now owns (not processed, not leased elsewhere)"""
+        if not uris:
+            return []
+        now = time.time()
+        with self.lock:
+            self.flush()
+            c = self.conn
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                # Expired leases belong to crashed or stuck workers; their posts are fair game again
+                reclaimed = c.execute('DELETE FROM claims WHERE expires_at <= ?', (now,)).rowcount
+                c.executemany('''
+                    INSERT OR IGNORE INTO claims (uri, worker, expires_at)
+                    SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM insights WHERE uri = ?)
+                ''', [(uri, self.worker_id, now + ttl, uri) for uri in uris])
+                owned = set()
+                for i in range(0, len(uris), 500):
+                    chunk = uris[i:i + 500]
+                    owned.update(row[0] for row in c.execute(
+                        f'SELECT uri FROM claims WHERE worker = ? AND uri IN ({",".join("?" * len(chunk))})',
+                        [self.worker_id, *chunk]
+                    ))
+                c.execute('COMMIT')
+            except Exception:
+                c.execute('ROLLBACK')
+                raise
+        self.last_renewal = now
+        if reclaimed:
+            print(f'  Reclaimed {reclaimed} expired leases')
+        return [uri for uri in uris if uri in owned]
+    
+    def renew_claims(self, ttl=CLAIM_TTL_SECONDS):
+        """Extend this worker's leases; cheap to call often, it only writes once a third of the TTL has passed"""
+        now = time.time()
+        if now - self.last_renewal < ttl / 3:
+            return
+        with self.lock:
+            with self.conn:
+                self.conn.execute('UPDATE claims SET expires_at = ? WHERE worker = ?', (now + ttl, self.worker_id))
+        self.last_renewal = now
+    
+    def release_claims(self):
+        """Drop this worker's leases once its insights are flushed; unfinished posts go back to the pool"""
+        with self.lock:
+            self.flush()
+            with self.conn:
+                self.conn.execute('DELETE FROM claims WHERE worker = ?', (self.worker_id,))
+    
+    def processed_uris(self):
+        """Set of already processed URIs"""
+        with self.lock:
+            self.flush()
+            return set(row[0] for row in self.conn.execute('SELECT uri FROM insights'))
+    
+    def processed_count(self):
+        """Count of already processed posts"""
+        with self.lock:
+            self.flush()
+            return self.conn.execute('SELECT COUNT(*) FROM insights').fetchone()[0]
+    
+    def close(self):
+        with self.lock:
+            if self.conn is None:
+                return
+            self.release_claims()
+            self.conn.close()
+            self.conn = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+_store = None
+
+
+def get_store():
+    """Process-wide InsightsStore, flushed and closed at interpreter exit"""
+    global _store
+    if _store is None:
+        _store = InsightsStore()
+        atexit.register(_store.close)
+    return _store
+
+
+def save_insight(uri, text, insights):
+    """Save extracted insights to database (buffered, see InsightsStore)"""
+    get_store().add(uri, text, insights)
+
+
+def record_failure(uri, reason):
+    """Record a failed extraction in the retry queue"""
+    get_store().add_failure(uri, reason)
 
 
 def get_processed_uris():
     """Get set of already processed URIs"""
-    conn = sqlite3.connect(INSIGHTS_DB)
-    c = conn.cursor()
-    c.execute('SELECT uri FROM insights')
-    uris = set(row[0] for row in c.fetchall())
-    conn.close()
-    return uris
+    return get_store().processed_uris()
 
 
 def get_processed_count():
     """Get count of already processed posts"""
-    conn = sqlite3.connect(INSIGHTS_DB)
-    c = conn.cursor()
-    c.execute('SELECT COUNT(*) FROM insights')
-    count = c.fetchone()[0]
-    conn.close()
-    return count
+    return get_store().processed_count()
 
 
 def run_test():
@@ -170,6 +1151,7 @@ def run_test():
     test_text = 'Just picked up some Blue Dream from the dispensary in Denver. This batch is incredible - super relaxed and creative vibes. Highly recommend!'
     
     print(f'Test post: {test_text[:80]}...')
+    get_ollama().warm_up()
     print('Sending to Qwen2.5...')
     
     start = time.time()
@@ -180,6 +1162,7 @@ def run_test():
         print(f'\n[SUCCESS] Extraction completed in {elapsed:.1f}s')
         print('Result:')
         print(json.dumps(result, indent=2))
+        print(f'Ollama: {get_ollama().summary()}')
         return True
     else:
         print('[FAILED] Could not extract insights')
@@ -191,14 +1174,16 @@ def process_batch(uris, processed_set):
     success = 0
     errors = 0
     
+    # Hydrate all pending posts up front in getPosts-sized chunks
+    texts, _ = fetch_posts_text([uri for uri in uris if uri not in processed_set])
+    
     for i, uri in enumerate(uris):
         if uri in processed_set:
             continue
             
         print(f'  [{i+1}/{len(uris)}] Processing: {uri[:60]}...')
         
-        # Fetch post text
-        text = fetch_post_text(uri)
+        text = texts.get(uri)
         if not text:
             errors += 1
             continue
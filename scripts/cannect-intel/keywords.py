@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Cannect Intelligence - Keyword Analytics
+Top keywords, co-occurrence and trends from the insight_keywords inverted index.
+Every query is an index lookup over insight_keywords; the insights.keywords blobs are never parsed.
+"""
+
+import sqlite3
+import json
+import argparse
+
+from stats import normalize_lower
+
+INSIGHTS_DB = '/root/cannect-intel/insights.db'
+
+# Bucket expressions over the ISO-8601 extracted_at column
+WINDOWS = {
+    'hour': 'substr(extracted_at, 1, 13)',
+    'day': 'substr(extracted_at, 1, 10)',
+    'week': "strftime('%Y-W%W', extracted_at)",
+    'month': 'substr(extracted_at, 1, 7)',
+}
+
+
+def normalize_keywords(keywords):
+    """Distinct lower-cased keywords from a JSON blob, a list, or a comma-separated string"""
+    if not keywords:
+        return []
+    if isinstance(keywords, str):
+        try:
+            keywords = json.loads(keywords)
+        except ValueError:
+            pass
+    if isinstance(keywords, str):
+        keywords = keywords.split(',')
+    if not isinstance(keywords, list):
+        keywords = [keywords]
+
+    seen = []
+    for keyword in keywords:
+        keyword = normalize_lower(keyword)
+        if keyword and keyword not in seen:
+            seen.append(keyword)
+    return seen
+
+
+def _window_clause(since, until, column='extracted_at'):
+    """WHERE fragment and params for an optional [since, until) time range"""
+    clauses, params = [], []
+    if since:
+        clauses.append(f'{column} >= ?')
+        params.append(since)
+    if until:
+        clauses.append(f'{column} < ?')
+        params.append(until)
+    return ' AND '.join(clauses) or '1', params
+
+
+def _query(db_path, sql, params):
+    conn = sqlite3.connect(db_path or INSIGHTS_DB)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return rows
+
+
+def top_keywords(k=20, since=None, until=None, db_path=None):
+    """[(keyword, posts)] for the k most frequent keywords in the window"""
+    where, params = _window_clause(since, until)
+    return _query(db_path, f'''
+        SELECT keyword, COUNT(*) FROM insight_keywords
+        WHERE {where}
+        GROUP BY keyword ORDER BY COUNT(*) DESC, keyword LIMIT ?
+    ''', params + [k])
+
+
+def related_keywords(keyword, k=20, since=None, until=None, db_path=None):
+    """[(other keyword, posts)] that appear on the same posts as keyword"""
+    where, params = _window_clause(since, until, 'a.extracted_at')
+    return _query(db_path, f'''
+        SELECT b.keyword, COUNT(*) FROM insight_keywords a
+        JOIN insight_keywords b ON b.uri = a.uri AND b.keyword != a.keyword
+        WHERE a.keyword = ? AND {where}
+        GROUP BY b.keyword ORDER BY COUNT(*) DESC, b.keyword LIMIT ?
+    ''', [normalize_lower(keyword)] + params + [k])
+
+
+def top_pairs(k=20, since=None, until=None, db_path=None):
+    """[(keyword, keyword, posts)] for the k most frequent co-occurring pairs in the window"""
+    where, params = _window_clause(since, until, 'a.extracted_at')
+    return _query(db_path, f'''
+        SELECT a.keyword, b.keyword, COUNT(*) FROM insight_keywords a
+        JOIN insight_keywords b ON b.uri = a.uri AND b.keyword > a.keyword
+        WHERE {where}
+        GROUP BY a.keyword, b.keyword ORDER BY COUNT(*) DESC, a.keyword, b.keyword LIMIT ?
+    ''', params + [k])
+
+
+def keyword_trend(keyword, window='day', with_keyword=None, since=None, until=None, db_path=None):
+    """[(bucket, posts)] mentioning keyword per time window; with_keyword limits it to co-occurrences"""
+    bucket = WINDOWS[window].replace('extracted_at', 'a.extracted_at')
+    where, params = _window_clause(since, until, 'a.extracted_at')
+    join, join_params = '', []
+    if with_keyword:
+        join = 'JOIN insight_keywords b ON b.uri = a.uri AND b.keyword = ?'
+        join_params = [normalize_lower(with_keyword)]
+    return _query(db_path, f'''
+        SELECT {bucket} AS bucket, COUNT(*) FROM insight_keywords a
+        {join}
+        WHERE a.keyword = ? AND {where}
+        GROUP BY bucket ORDER BY bucket
+    ''', join_params + [normalize_lower(keyword)] + params)
+
+
+def print_rows(title, rows):
+    print("=" * 60)
+    print(title)
+    print("=" * 60)
+    for *values, count in rows:
+        print(f"  {count:4} | {' + '.join(str(v) for v in values)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cannect Intelligence keyword analytics')
+    parser.add_argument('--since', help='Only posts extracted at or after this ISO timestamp')
+    parser.add_argument('--until', help='Only posts extracted before this ISO timestamp')
+    parser.add_argument('-k', type=int, default=20, help='Number of results')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('top', help='Most frequent keywords')
+    p_related = sub.add_parser('related', help='Keywords that co-occur with KEYWORD')
+    p_related.add_argument('keyword')
+    sub.add_parser('pairs', help='Most frequent co-occurring keyword pairs')
+    p_trend = sub.add_parser('trend', help='Posts mentioning KEYWORD per time window')
+    p_trend.add_argument('keyword')
+    p_trend.add_argument('--window', choices=sorted(WINDOWS), default='day')
+    p_trend.add_argument('--with', dest='with_keyword', help='Only count posts that also mention this keyword')
+
+    args = parser.parse_args()
+
+    # Creates and backfills insight_keywords if this install hasn't run the migration yet
+    from extractor import init_db
+    init_db(verbose=False)
+
+    window = {'since': args.since, 'until': args.until}
+    if args.command == 'top':
+        title, rows = 'TOP KEYWORDS', top_keywords(args.k, **window)
+    elif args.command == 'related':
+        title, rows = f'KEYWORDS WITH "{args.keyword}"', related_keywords(args.keyword, args.k, **window)
+    elif args.command == 'pairs':
+        title, rows = 'TOP KEYWORD PAIRS', top_pairs(args.k, **window)
+    else:
+        title = f'"{args.keyword}" PER {args.window.upper()}'
+        rows = keyword_trend(args.keyword, args.window, args.with_keyword, **window)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_rows(title, rows)
@@ -8,21 +8,13 @@ import subprocess
 import time
 from datetime import datetime
 import os
+from throttle import get_load_average, MAX_LOAD
 
 # Configuration
 RUN_24_7 = True      # Run anytime, not just off-peak
 OFF_PEAK_START = 0   # 12 AM (ignored if RUN_24_7)
 OFF_PEAK_END = 6     # 6 AM (ignored if RUN_24_7)
 BATCH_SIZE = 500     # Posts per run (increased for 24/7 mode)
-MAX_LOAD = 4.0       # Max 1-minute load average (4 cores = allow full usage)
-
-def get_load_average():
-    """Get 1-minute load average"""
-    try:
-        with open('/proc/loadavg', 'r') as f:
-            return float(f.read().split()[0])
-    except:
-        return 0.5
 
 def is_off_peak():
     """Check if current time is in off-peak window (or always True if RUN_24_7)"""
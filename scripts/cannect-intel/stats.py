@@ -1,61 +1,117 @@
 #!/usr/bin/env python3
-"""Quick stats viewer"""
+"""
+Cannect Intelligence - Insight Stats
+Mood, product, location and post-type histograms from index-only GROUP BYs over insights.
+Shared by `python stats.py` and `python batch.py stats`.
+"""
+
 import sqlite3
+import json
+import argparse
+from collections import Counter
+
+INSIGHTS_DB = '/root/cannect-intel/insights.db'
+SAMPLE_COUNT = 10
+TOP = {'moods': 15, 'products': 30, 'locations': 25, 'post_types': None}
+
+# Placeholder strings the model emits instead of a real null
+NULL_VALUES = {'', 'null', 'none', 'no product', 'n/a'}
+
+
+def normalize(value):
+    """None for missing or placeholder values, otherwise the stripped string"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return None if value.lower() in NULL_VALUES else value
+
+
+def normalize_lower(value):
+    """Lower-cased normalize(), as stored in the product_norm/location_norm columns"""
+    value = normalize(value)
+    return value.lower() if value is not None else None
+
+
+def _grouped(conn, column, where=''):
+    """Counter of column values, normalized in Python (GROUP BY output is small)"""
+    counter = Counter()
+    for value, count in conn.execute(f'SELECT {column}, COUNT(*) FROM insights {where} GROUP BY {column}'):
+        counter[normalize(value)] += count
+    return counter
+
+
+def compute_stats(db_path=None, top=None, samples=SAMPLE_COUNT):
+    """Histograms for every dimension plus sample posts; needs the columns/indexes from extractor.init_db"""
+    top = {**TOP, **(top or {})}
+
+    conn = sqlite3.connect(db_path or INSIGHTS_DB)
+    # Each GROUP BY is answered from its own index without touching the table
+    histograms = {
+        'moods': _grouped(conn, 'mood'),
+        'products': _grouped(conn, 'product_norm', 'WHERE product_norm IS NOT NULL'),
+        'locations': _grouped(conn, 'location_norm', 'WHERE location_norm IS NOT NULL'),
+        'post_types': _grouped(conn, 'post_type'),
+    }
+
+    # Trigger-maintained count from the progress ledger instead of a COUNT(*) scan
+    row = conn.execute("SELECT value FROM progress WHERE key = 'insights'").fetchone()
+    total = row[0] if row else conn.execute('SELECT COUNT(*) FROM insights').fetchone()[0]
+
+    sample_rows = [
+        {'product': normalize(product), 'mood': normalize(mood), 'text': text}
+        for product, mood, text in conn.execute(
+            'SELECT product, mood, substr(post_text, 1, 80) FROM insights WHERE product_norm IS NOT NULL LIMIT ?',
+            (samples,)
+        )
+    ]
+    conn.close()
+
+    stats = {'total': total, 'samples': sample_rows}
+    for name, counter in histograms.items():
+        stats[name] = counter.most_common(top[name])
+    return stats
+
+
+def print_stats(stats):
+    print("=" * 60)
+    print("CANNECT INTELLIGENCE - CURRENT INSIGHTS")
+    print("=" * 60)
+
+    print(f"\nTotal Posts Analyzed: {stats['total']}")
+
+    sections = [
+        ('MOOD BREAKDOWN', 'moods', '(not detected)'),
+        ('PRODUCTS/STRAINS MENTIONED', 'products', None),
+        ('LOCATIONS MENTIONED', 'locations', None),
+        ('POST TYPES', 'post_types', '(not classified)'),
+    ]
+    for title, name, missing in sections:
+        print("\n" + "=" * 60)
+        print(title)
+        print("=" * 60)
+        for value, count in stats[name]:
+            print(f"  {count:4} | {value if value is not None else missing}")
+
+    print("\n" + "=" * 60)
+    print("SAMPLE POSTS WITH PRODUCTS")
+    print("=" * 60)
+    for sample in stats['samples']:
+        print(f"\n  Product: {sample['product']}")
+        print(f"  Mood: {sample['mood']}")
+        print(f"  Text: {sample['text']}...")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cannect Intelligence insight stats')
+    parser.add_argument('--json', action='store_true', help='Print stats as JSON')
+    args = parser.parse_args()
+
+    # Applies the normalized-column migration if this install hasn't run it yet
+    from extractor import init_db
+    init_db(verbose=False)
 
-conn = sqlite3.connect('/root/cannect-intel/insights.db')
-c = conn.cursor()
-
-print("=" * 60)
-print("CANNECT INTELLIGENCE - CURRENT INSIGHTS")
-print("=" * 60)
-
-c.execute('SELECT COUNT(*) FROM insights')
-total = c.fetchone()[0]
-print(f"\nTotal Posts Analyzed: {total}")
-
-print("\n" + "=" * 60)
-print("MOOD BREAKDOWN")
-print("=" * 60)
-c.execute('SELECT mood, COUNT(*) FROM insights GROUP BY mood ORDER BY COUNT(*) DESC LIMIT 15')
-for row in c.fetchall():
-    mood = row[0] if row[0] else "(not detected)"
-    print(f"  {row[1]:4} | {mood}")
-
-print("\n" + "=" * 60)
-print("PRODUCTS/STRAINS MENTIONED")
-print("=" * 60)
-c.execute('SELECT product, COUNT(*) FROM insights WHERE product IS NOT NULL GROUP BY product ORDER BY COUNT(*) DESC LIMIT 30')
-for row in c.fetchall():
-    if row[0] and row[0].lower() not in ['null', 'no product', 'none', '']:
-        print(f"  {row[1]:4} | {row[0]}")
-
-print("\n" + "=" * 60)
-print("LOCATIONS MENTIONED")
-print("=" * 60)
-c.execute('SELECT location, COUNT(*) FROM insights WHERE location IS NOT NULL GROUP BY location ORDER BY COUNT(*) DESC LIMIT 25')
-for row in c.fetchall():
-    if row[0] and row[0].lower() not in ['null', 'none', '']:
-        print(f"  {row[1]:4} | {row[0]}")
-
-print("\n" + "=" * 60)
-print("POST TYPES")
-print("=" * 60)
-c.execute('SELECT post_type, COUNT(*) FROM insights GROUP BY post_type ORDER BY COUNT(*) DESC')
-for row in c.fetchall():
-    ptype = row[0] if row[0] else "(not classified)"
-    print(f"  {row[1]:4} | {ptype}")
-
-print("\n" + "=" * 60)
-print("SAMPLE POSTS WITH PRODUCTS")
-print("=" * 60)
-c.execute('''SELECT product, mood, substr(post_text, 1, 80) 
-             FROM insights 
-             WHERE product IS NOT NULL 
-             AND product NOT IN ('null', 'no product', 'None', '') 
-             LIMIT 10''')
-for row in c.fetchall():
-    print(f"\n  Product: {row[0]}")
-    print(f"  Mood: {row[1]}")
-    print(f"  Text: {row[2]}...")
-
-conn.close()
+    stats = compute_stats()
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print_stats(stats)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Cannect Intelligence - Adaptive Throttle
+AIMD rate control for extraction, driven by system load and Ollama latency
+"""
+
+import asyncio
+import threading
+import time
+
+# Configuration
+MAX_LOAD = 4.0             # Max 1-minute load average (4 cores = allow full usage)
+BACKOFF_LOAD = 0.9         # Back off above this fraction of MAX_LOAD, before it is crossed
+GROW_LOAD = 0.75           # Only add concurrency below this fraction of MAX_LOAD
+LATENCY_FACTOR = 2.0       # Ollama latency this many times the session best counts as overloaded
+LATENCY_EWMA = 0.3         # Smoothing for observed latency
+SAMPLE_INTERVAL = 5        # Seconds between control decisions
+MIN_DELAY = 0.0            # Seconds between requests when there is headroom
+MAX_DELAY = 30.0           # Seconds between requests at full backoff
+BACKOFF_DELAY = 0.5        # First non-zero delay after backing off from MIN_DELAY
+
+
+def get_load_average():
+    """Get 1-minute load average"""
+    try:
+        with open('/proc/loadavg', 'r') as f:
+            return float(f.read().split()[0])
+    except:
+        return 0.5
+
+
+class AdaptiveThrottle:
+    """Concurrency and inter-request delay that grow additively and shrink multiplicatively"""
+
+    def __init__(self, max_concurrency=1, delay=1.0, max_load=MAX_LOAD):
+        self.max_concurrency = max_concurrency
+        self.concurrency = 1.0
+        self.delay = delay
+        self.max_load = max_load
+        self.latency = None
+        self.best_latency = None
+        self.load = 0.0
+        self.last_sample = 0.0
+        self.lock = threading.Lock()
+        self.stats = {'increases': 0, 'backoffs': 0, 'paused_s': 0.0}
+
+    @property
+    def limit(self):
+        """Number of requests allowed in flight right now"""
+        return max(1, int(self.concurrency))
+
+    def record(self, latency):
+        """Feed one Ollama request latency (seconds) into the controller"""
+        with self.lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = LATENCY_EWMA * latency + (1 - LATENCY_EWMA) * self.latency
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+        self.adjust()
+
+    def adjust(self, force=False):
+        """Re-sample load and apply one AIMD step, at most every SAMPLE_INTERVAL seconds"""
+        with self.lock:
+            now = time.time()
+            if not force and now - self.last_sample < SAMPLE_INTERVAL:
+                return
+            self.last_sample = now
+            self.load = get_load_average()
+
+            slow = (self.latency is not None and self.best_latency
+                    and self.latency > self.best_latency * LATENCY_FACTOR)
+
+            if self.load > self.max_load * BACKOFF_LOAD or slow:
+                # Multiplicative decrease: halve concurrency, double the delay
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self.delay = min(MAX_DELAY, max(BACKOFF_DELAY, self.delay * 2))
+                self.stats['backoffs'] += 1
+            elif self.load < self.max_load * GROW_LOAD:
+                # Additive increase: shed the delay first, then add one request in flight
+                if self.delay > MIN_DELAY:
+                    self.delay = self.delay / 2 if self.delay / 2 >= 0.05 else MIN_DELAY
+                else:
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                self.stats['increases'] += 1
+
+    def pause(self):
+        """Sleep for the current inter-request delay"""
+        self.adjust()
+        if self.delay > 0:
+            time.sleep(self.delay)
+            with self.lock:
+                self.stats['paused_s'] += self.delay
+
+    async def pause_async(self):
+        self.adjust()
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+            with self.lock:
+                self.stats['paused_s'] += self.delay
+
+    def summary(self):
+        return (f"load {self.load:.2f}/{self.max_load} | concurrency {self.limit}/{self.max_concurrency} | "
+                f"delay {self.delay:.2f}s | {self.stats['increases']} increases, {self.stats['backoffs']} backoffs, "
+                f"{self.stats['paused_s']:.0f}s paused")